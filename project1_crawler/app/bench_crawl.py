@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the crawler hot path: worker.crawl_board and
+worker.crawl_bsky_actor run unmodified against recorded fixtures instead of
+a.4cdn.org / the Bluesky API.
+
+Fixtures (FIXTURES dir, default ./bench_fixtures):
+    chan/<board>/catalog.json          catalog.json as served by 4chan
+    chan/<board>/thread/<no>.json      one file per thread
+    bsky/<actor>/page-000.json ...     getAuthorFeed responses, newest first
+
+    python bench_crawl.py --synth                        # synthetic fixtures
+    python bench_crawl.py --record-chan sp --threads 40  # capture live 4chan JSON
+    python bench_crawl.py --record-bsky nba.com.bsky.social --pages 5 --actor nba.com.bsky.social
+    python bench_crawl.py --db null --json out.json      # run, no database
+    python bench_crawl.py --db pg --compare base.json    # run against DATABASE_URL
+
+Synthetic fixtures come from a fixed seed, so every checkout generates the
+same bytes; recorded ones are only comparable with themselves.
+
+--db pg writes into session TEMP copies of posts_4chan / posts_bsky (as in
+bench_ingest.py), so real tables are never touched. --db null replaces the
+insert with COPY-encoding the rows, which keeps the client-side cost.
+
+Each case runs cold (empty crawl state, everything is new) and warm (same
+fixtures again, nothing is new). Reported per case: posts/sec, time split
+into fetch (fixture decode + --latency), parse (everything in the crawl
+function that is neither fetch nor insert) and insert, and peak Python
+memory from a separate tracemalloc pass. Thread fetches run inline by
+default so the split adds up; --inflight N uses the real fetch pool. --json saves the numbers with the
+git commit; --compare flags cases that got slower than --tolerance.
+"""
+import argparse
+import io
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import worker
+from config import DATABASE_URL
+from db import ConnectionPool, _copy_value
+from state import StateStore
+
+FIXTURES = Path(__file__).resolve().parent / "bench_fixtures"
+
+
+# ---------- fixtures ----------
+
+_WORDS = ("he", "thinks", "final", "score", "keeper", "offside", "var", "refs", "season", "trade",
+          "based", "cope", "lmao", "derby", "transfer", "window", "clean", "sheet", "injury", "bench")
+
+
+def _comment(rnd: random.Random, no: int) -> str:
+    words = " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(3, 60)))
+    quote = f'<a href="#p{no - rnd.randint(1, 50)}" class="quotelink">&gt;&gt;{no - 1}</a><br>' if rnd.random() < 0.5 else ""
+    green = '<span class="quote">&gt;' + rnd.choice(_WORDS) + "</span><br>" if rnd.random() < 0.2 else ""
+    return quote + green + words
+
+
+def synth_chan(out: Path, board: str, threads: int, posts: int, seed: int = 515) -> None:
+    rnd = random.Random(seed)
+    base_no, base_ts = 150_000_000, 1_761_955_200
+    (out / "thread").mkdir(parents=True, exist_ok=True)
+    pages: List[Dict] = [{"page": p + 1, "threads": []} for p in range((threads + 14) // 15)]
+    for t in range(threads):
+        op_no = base_no + t * 1000
+        n = max(1, int(rnd.paretovariate(1.2) * posts / 4))
+        n = min(n, posts * 3)
+        thread_posts = []
+        for i in range(n):
+            no = op_no + i
+            p = {
+                "no": no,
+                "now": "11/01/25(Sat)00:00:00",
+                "name": "Anonymous",
+                "com": _comment(rnd, no),
+                "time": base_ts + t * 60 + i * 7,
+                "resto": 0 if i == 0 else op_no,
+            }
+            if i == 0:
+                p.update({"sub": f"/{board}/ general #{t}", "replies": n - 1, "images": n // 5,
+                          "semantic_url": f"{board}-general-{t}"})
+            if rnd.random() < 0.2:
+                p.update({"filename": f"img{no}", "ext": ".jpg", "tim": no * 1000, "w": 800, "h": 600,
+                          "fsize": 123456, "md5": "bWQ1bWQ1bWQ1bWQ1bWQ1bQ=="})
+            thread_posts.append(p)
+        with (out / "thread" / f"{op_no}.json").open("w", encoding="utf-8") as f:
+            json.dump({"posts": thread_posts}, f)
+        op = dict(thread_posts[0])
+        op["last_modified"] = thread_posts[-1]["time"]
+        op["last_replies"] = thread_posts[-5:][1:] if n > 1 else []
+        pages[t // 15]["threads"].append(op)
+    with (out / "catalog.json").open("w", encoding="utf-8") as f:
+        json.dump(pages, f)
+
+
+def synth_bsky(out: Path, actor: str, pages: int, per_page: int = 100, seed: int = 515) -> None:
+    rnd = random.Random(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    did = "did:plc:" + "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz234567") for _ in range(24))
+    t = 1_761_955_200 + pages * per_page * 600
+    for pg in range(pages):
+        feed = []
+        for i in range(per_page):
+            t -= rnd.randint(60, 1200)
+            rkey = f"3l{t:x}{i:04d}"
+            stamp = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(t))
+            post = {
+                "uri": f"at://{did}/app.bsky.feed.post/{rkey}",
+                "cid": f"bafyreib{rnd.getrandbits(200):052x}"[:59],
+                "author": {"did": did, "handle": actor, "displayName": actor.split(".")[0],
+                           "avatar": f"https://cdn.bsky.app/img/avatar/plain/{did}/bafkrei@jpeg",
+                           "viewer": {"muted": False, "blockedBy": False}, "labels": [],
+                           "createdAt": "2024-01-01T00:00:00.000Z"},
+                "record": {"$type": "app.bsky.feed.post",
+                           "text": " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(5, 45))),
+                           "createdAt": stamp, "langs": ["en"]},
+                "indexedAt": stamp,
+                "likeCount": rnd.randint(0, 500),
+                "repostCount": rnd.randint(0, 80),
+                "replyCount": rnd.randint(0, 40),
+                "quoteCount": rnd.randint(0, 5),
+                "viewer": {"threadMuted": False, "embeddingDisabled": False},
+                "labels": [],
+            }
+            if rnd.random() < 0.3:
+                post["embed"] = {"$type": "app.bsky.embed.external#view",
+                                 "external": {"uri": "https://example.com/r", "title": "Match report",
+                                              "description": "Everything that happened"}}
+            item = {"post": post}
+            if rnd.random() < 0.05:
+                item["reason"] = {"$type": "app.bsky.feed.defs#reasonRepost",
+                                  "by": post["author"], "indexedAt": stamp}
+            feed.append(item)
+        page = {"feed": feed}
+        if pg < pages - 1:
+            page["cursor"] = f"cursor-{pg + 1:03d}"
+        with (out / f"page-{pg:03d}.json").open("w", encoding="utf-8") as f:
+            json.dump(page, f)
+
+
+def record_chan(out: Path, board: str, threads: int) -> None:
+    from chan_client import get_catalog, get_thread
+
+    (out / "thread").mkdir(parents=True, exist_ok=True)
+    catalog = get_catalog(board)
+    with (out / "catalog.json").open("w", encoding="utf-8") as f:
+        json.dump(catalog, f)
+    nos = [t["no"] for page in catalog for t in page.get("threads", [])][:threads]
+    for no in nos:
+        try:
+            tjson = get_thread(board, no)
+        except Exception as e:
+            print(f"skip thread {no}: {e}", file=sys.stderr)
+            continue
+        with (out / "thread" / f"{no}.json").open("w", encoding="utf-8") as f:
+            json.dump(tjson, f)
+    print(f"recorded /{board}/ catalog + {len(nos)} threads -> {out}")
+
+
+def record_bsky(out: Path, actor: str, pages: int) -> None:
+    from atproto_client.models.utils import get_model_as_dict
+    from bsky_client_cached import get_bsky_client
+
+    out.mkdir(parents=True, exist_ok=True)
+    client = get_bsky_client()
+    cursor = None
+    for pg in range(pages):
+        resp = client.app.bsky.feed.get_author_feed({"actor": actor, "cursor": cursor, "limit": 100})
+        with (out / f"page-{pg:03d}.json").open("w", encoding="utf-8") as f:
+            json.dump(get_model_as_dict(resp), f)
+        cursor = resp.cursor
+        if not cursor:
+            break
+    print(f"recorded {actor} {pg + 1} pages -> {out}")
+
+
+# ---------- fakes ----------
+
+class Timer:
+    """Accumulates seconds across threads."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, dt: float) -> None:
+        with self._lock:
+            self.seconds += dt
+            self.calls += 1
+
+
+class FixtureChan:
+    """Stands in for chan_client.get_catalog / get_thread."""
+
+    def __init__(self, root: Path, latency: float, timer: Timer):
+        self.root = root
+        self.latency = latency
+        self.timer = timer
+
+    def _load(self, path: Path):
+        t0 = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            # read + decode is what r.json() costs in the real client
+            with path.open("rb") as f:
+                return json.loads(f.read())
+        finally:
+            self.timer.add(time.perf_counter() - t0)
+
+    def get_catalog(self, board: str):
+        return self._load(self.root / board / "catalog.json")
+
+    def get_thread(self, board: str, thread_no: int, if_modified_since: Optional[int] = None):
+        path = self.root / board / "thread" / f"{thread_no}.json"
+        if not path.exists():
+            raise RuntimeError("Thread archived")
+        return self._load(path)
+
+
+class _FakeFeedAPI:
+    def __init__(self, root: Path, latency: float, timer: Timer):
+        self.root = root
+        self.latency = latency
+        self.timer = timer
+        self._next: Dict[tuple, int] = {}
+
+    def get_author_feed(self, params):
+        from atproto import models
+
+        t0 = time.perf_counter()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            # a page's own cursor (recorded or synthetic) leads to the next file
+            n = self._next.get((params["actor"], params.get("cursor")), 0)
+            path = self.root / params["actor"] / f"page-{n:03d}.json"
+            raw = path.read_text(encoding="utf-8") if path.exists() else '{"feed": []}'
+            # same work atproto does on a real response: JSON decode + model validation
+            resp = models.get_or_create(json.loads(raw), models.AppBskyFeedGetAuthorFeed.Response)
+            if resp.cursor:
+                self._next[(params["actor"], resp.cursor)] = n + 1
+            return resp
+        finally:
+            self.timer.add(time.perf_counter() - t0)
+
+
+class FakeBskyClient:
+    """Only what worker.crawl_bsky_actor touches: client.app.bsky.feed.get_author_feed."""
+
+    def __init__(self, root: Path, latency: float, timer: Timer):
+        feed = _FakeFeedAPI(root, latency, timer)
+        self.app = type("app", (), {"bsky": type("bsky", (), {"feed": feed})()})()
+        self.request = None  # no httpx client to hook
+
+
+def null_insert(timer: Timer):
+    def insert(conn, rows, copy: bool = False) -> int:
+        t0 = time.perf_counter()
+        buf = io.StringIO()
+        for r in rows:
+            buf.write("\t".join(_copy_value(v) for v in r.values()))
+            buf.write("\n")
+        timer.add(time.perf_counter() - t0)
+        return len(rows)
+    return insert
+
+
+class SerialExecutor:
+    """
+    ThreadPoolExecutor stand-in that runs each fetch inline at submit(), so
+    fetch, parse and insert never overlap and the split adds up to total.
+    """
+
+    def __init__(self, max_workers=None):
+        pass
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullPool:
+    """get_pool() stand-in for --db null: hands out no connection at all."""
+
+    def getconn(self):
+        return None
+
+    def putconn(self, conn) -> None:
+        pass
+
+    @contextmanager
+    def connection(self):
+        yield None
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+
+def timed_insert(fn, timer: Timer):
+    def insert(conn, rows, copy: bool = False) -> int:
+        t0 = time.perf_counter()
+        try:
+            return fn(conn, rows, copy=copy)
+        finally:
+            timer.add(time.perf_counter() - t0)
+    return insert
+
+
+def shadow_tables(pool: ConnectionPool) -> None:
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        for t in ("posts_4chan", "posts_bsky"):
+            cur.execute(f"DROP TABLE IF EXISTS pg_temp.{t}")
+            cur.execute(f"CREATE TEMP TABLE {t} (LIKE public.{t} INCLUDING ALL)")
+        conn.commit()
+        cur.close()
+
+
+# ---------- runs ----------
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.fetch = Timer()
+        self.insert = Timer()
+        self.tmp = Path(tempfile.mkdtemp(prefix="bench_crawl_"))
+        self.store: Optional[StateStore] = None
+        self.pool: Optional[ConnectionPool] = None
+        chan = FixtureChan(args.fixtures / "chan", args.latency, self.fetch)
+        bsky = FakeBskyClient(args.fixtures / "bsky", args.latency, self.fetch)
+
+        worker.SPOOL_ENABLED = False
+        worker.get_state = lambda: self.store
+        worker.get_catalog = chan.get_catalog
+        worker.get_thread = chan.get_thread
+        worker.get_bsky_client = lambda *a, **k: bsky
+        worker.BSKY_HEAD_PAGES = args.pages
+        if args.inflight > 0:
+            worker.CHAN_MAX_INFLIGHT = args.inflight
+        else:
+            worker.ThreadPoolExecutor = SerialExecutor
+        # fixtures have no request budget to respect
+        worker.BSKY_LIMITER.rate = 0
+        if args.db == "pg":
+            # one connection, so the TEMP tables are the ones every insert sees
+            self.pool = ConnectionPool(DATABASE_URL, max_size=1)
+            worker.get_pool = lambda url=None: self.pool
+            worker.insert_4chan_posts = timed_insert(worker.insert_4chan_posts, self.insert)
+            worker.insert_bsky_posts = timed_insert(worker.insert_bsky_posts, self.insert)
+        else:
+            worker.get_pool = lambda url=None: NullPool()
+            worker.insert_4chan_posts = null_insert(self.insert)
+            worker.insert_bsky_posts = null_insert(self.insert)
+
+    def reset(self) -> None:
+        if self.store is not None:
+            self.store.close()
+        for p in self.tmp.glob("state.sqlite3*"):
+            p.unlink()
+        self.store = StateStore(self.tmp / "state.sqlite3")
+        if self.pool is not None:
+            shadow_tables(self.pool)
+
+    def _measure(self, fn, count_key: str) -> Dict[str, float]:
+        self.fetch.seconds = self.insert.seconds = 0.0
+        t0 = time.perf_counter()
+        result = fn()
+        total = time.perf_counter() - t0
+        posts = int(result.get(count_key, 0))
+        return {
+            "posts": posts,
+            "total_s": total,
+            "fetch_s": self.fetch.seconds,
+            "insert_s": self.insert.seconds,
+            "parse_s": max(0.0, total - self.fetch.seconds - self.insert.seconds),
+            "posts_per_s": posts / total if total else 0.0,
+        }
+
+    def case(self, fn, count_key: str) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for phase in ("cold", "warm"):
+            best = None
+            for _ in range(self.args.repeat):
+                self.reset()
+                if phase == "warm":
+                    fn()
+                m = self._measure(fn, count_key)
+                if best is None or m["total_s"] < best["total_s"]:
+                    best = m
+            out[phase] = best
+
+        # peak memory on its own pass: tracemalloc slows everything down
+        self.reset()
+        tracemalloc.start()
+        fn()
+        out["cold"]["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        return out
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=Path(__file__).resolve().parent).strip()
+    except Exception:
+        return "unknown"
+
+
+def report(results: Dict, baseline: Optional[Dict], tolerance: float) -> int:
+    regressions = 0
+    for name, phases in results["cases"].items():
+        for phase, m in phases.items():
+            line = (f"{name:22s} {phase:4s} posts={m['posts']:6d} {m['posts_per_s']:10.0f} posts/s  "
+                    f"total={m['total_s']:7.3f}s fetch={m['fetch_s']:7.3f}s parse={m['parse_s']:7.3f}s "
+                    f"insert={m['insert_s']:7.3f}s")
+            if "peak_mb" in m:
+                line += f" peak={m['peak_mb']:6.1f}MB"
+            base = (baseline or {}).get("cases", {}).get(name, {}).get(phase)
+            if base and base.get("total_s"):
+                ratio = m["total_s"] / base["total_s"]
+                flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+                regressions += bool(flag)
+                line += f"  x{ratio:4.2f} vs {baseline.get('commit', '?')}{flag}"
+            print(line)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--fixtures", type=Path, default=FIXTURES)
+    ap.add_argument("--synth", action="store_true", help="(re)write the synthetic fixtures and exit")
+    ap.add_argument("--record-chan", metavar="BOARD", help="record live catalog + threads for BOARD and exit")
+    ap.add_argument("--record-bsky", metavar="ACTOR", help="record live author feed pages for ACTOR and exit")
+    ap.add_argument("--threads", type=int, default=150, help="threads per board (synth/record)")
+    ap.add_argument("--posts", type=int, default=60, help="typical posts per synthetic thread")
+    ap.add_argument("--pages", type=int, default=5, help="feed pages per actor (synth/record, and crawled)")
+    ap.add_argument("--board", default="sp")
+    ap.add_argument("--actor", default="bench.bsky.social")
+    ap.add_argument("--db", choices=("null", "pg"), default="null")
+    ap.add_argument("--latency", type=float, default=0.0, help="simulated seconds per upstream request")
+    ap.add_argument("--inflight", type=int, default=0,
+                    help="thread fetches in flight; 0 = inline, so fetch/parse/insert add up to total")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", type=Path, help="write results here")
+    ap.add_argument("--compare", type=Path, help="baseline results from an earlier --json")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="slowdown flagged as a regression")
+    args = ap.parse_args()
+
+    if args.record_chan:
+        record_chan(args.fixtures / "chan" / args.record_chan, args.record_chan, args.threads)
+        return
+    if args.record_bsky:
+        record_bsky(args.fixtures / "bsky" / args.record_bsky, args.record_bsky, args.pages)
+        return
+    chan_dir = args.fixtures / "chan" / args.board
+    bsky_dir = args.fixtures / "bsky" / args.actor
+    if args.synth or not chan_dir.exists():
+        synth_chan(chan_dir, args.board, args.threads, args.posts)
+    if args.synth or not bsky_dir.exists():
+        synth_bsky(bsky_dir, args.actor, args.pages)
+    if args.synth:
+        print(f"synthetic fixtures -> {args.fixtures}")
+        return
+
+    h = Harness(args)
+    results = {
+        "commit": git_commit(),
+        "db": args.db,
+        "latency": args.latency,
+        "inflight": args.inflight,
+        "python": sys.version.split()[0],
+        "cases": {
+            f"crawl_board/{args.board}": h.case(lambda: worker._crawl_board(args.board), "inserted"),
+            "crawl_bsky_actor": h.case(lambda: worker._crawl_bsky_actor(args.actor), "inserted_total"),
+        },
+    }
+    print(f"commit={results['commit']} db={args.db} latency={args.latency}s inflight={args.inflight} "
+          f"repeat={args.repeat} "
+          f"fixtures={args.fixtures}")
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    regressions = report(results, baseline, args.tolerance)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
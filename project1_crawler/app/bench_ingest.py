@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Compare the executemany and COPY ingest paths in db.py.
+
+Runs against DATABASE_URL but never touches the real tables: each run
+creates session-local TEMP copies of posts_4chan / posts_bsky (and the
+bsky_uris registry), which shadow the real ones for this connection only.
+
+    python bench_ingest.py --rows 5000 --repeat 3
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone, timedelta
+
+from config import DATABASE_URL
+from db import get_conn, insert_4chan_posts, insert_bsky_posts
+
+
+def make_4chan_rows(n: int):
+    base = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        post_no = 100000000 + i
+        rows.append({
+            "board_name": "sp",
+            "thread_number": 100000000 + (i // 150) * 150,
+            "post_number": post_no,
+            "created_at": base + timedelta(seconds=i),
+            "data": {
+                "no": post_no,
+                "time": int((base + timedelta(seconds=i)).timestamp()),
+                "name": "Anonymous",
+                "com": "&gt;he thinks\t" + "lorem ipsum dolor " * random.randint(1, 20) + "\\n<br>",
+                "resto": 100000000 + (i // 150) * 150,
+            },
+            "has_media": i % 5 == 0,
+        })
+    return rows
+
+
+def make_bsky_rows(n: int):
+    base = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        uri = f"at://did:plc:bench{i % 35}/app.bsky.feed.post/{i:012d}"
+        rows.append({
+            "actor": f"bench{i % 35}.bsky.social",
+            "uri": uri,
+            "created_at": base + timedelta(seconds=i),
+            "data": {
+                "uri": uri,
+                "record": {"text": "final score 3-1 " * random.randint(1, 10), "langs": ["en"]},
+                "like_count": i % 50,
+            },
+            "stance": None,
+            "like_count": i % 50,
+            "repost_count": i % 7,
+            "has_media": i % 3 == 0,
+        })
+    return rows
+
+
+def shadow_tables(conn):
+    cur = conn.cursor()
+    for t in ("posts_4chan", "posts_bsky", "bsky_uris"):
+        cur.execute(f"DROP TABLE IF EXISTS pg_temp.{t}")
+        cur.execute(f"CREATE TEMP TABLE {t} (LIKE public.{t} INCLUDING ALL)")
+    conn.commit()
+    cur.close()
+
+
+def run(conn, fn, rows, batch, copy):
+    t0 = time.perf_counter()
+    inserted = 0
+    for i in range(0, len(rows), batch):
+        inserted += fn(conn, rows[i:i + batch], copy=copy)
+    return time.perf_counter() - t0, inserted
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--batch", type=int, default=150, help="rows per insert call (one 4chan thread ~ 150)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    datasets = [
+        ("posts_4chan", insert_4chan_posts, make_4chan_rows(args.rows)),
+        ("posts_bsky", insert_bsky_posts, make_bsky_rows(args.rows)),
+    ]
+
+    conn = get_conn(DATABASE_URL)
+    try:
+        print(f"rows={args.rows} batch={args.batch} repeat={args.repeat}")
+        for table, fn, rows in datasets:
+            for mode, copy in (("executemany", False), ("copy", True)):
+                best_fresh = best_dupe = None
+                counts = None
+                for _ in range(args.repeat):
+                    shadow_tables(conn)
+                    fresh_s, fresh_n = run(conn, fn, rows, args.batch, copy)
+                    # second pass: every row conflicts, inserted must be 0
+                    dupe_s, dupe_n = run(conn, fn, rows, args.batch, copy)
+                    counts = (fresh_n, dupe_n)
+                    best_fresh = fresh_s if best_fresh is None else min(best_fresh, fresh_s)
+                    best_dupe = dupe_s if best_dupe is None else min(best_dupe, dupe_s)
+                print(
+                    f"{table:12s} {mode:12s} new={best_fresh:7.3f}s ({args.rows / best_fresh:9.0f} rows/s) "
+                    f"dupes={best_dupe:7.3f}s inserted={counts[0]}/{counts[1]}"
+                )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
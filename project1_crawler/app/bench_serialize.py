@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-post serialization for posts_bsky.data.
+
+  old   as_primitive(post) -> dict, then psycopg2 Json -> json.dumps
+  lean  bsky_client.serialize_post(post): one pydantic model_dump_json,
+        full (the default) or with the LEAN_FIELDS projection
+
+Needs atproto (for real PostView models); no network or database.
+
+    python bench_serialize.py --posts 200 --repeat 50
+"""
+import argparse
+import json
+import time
+
+from atproto import models
+
+from bsky_client import as_primitive, include_spec, serialize_post, LEAN_FIELDS
+
+
+def make_feed(n: int):
+    feed = []
+    for i in range(n):
+        did = f"did:plc:bench{i % 35:04d}"
+        raw = {
+            "post": {
+                "uri": f"at://{did}/app.bsky.feed.post/{i:012d}",
+                "cid": f"bafyreib{i:052d}",
+                "author": {
+                    "did": did,
+                    "handle": f"bench{i % 35}.bsky.social",
+                    "displayName": "Bench Account",
+                    "avatar": "https://cdn.bsky.app/img/avatar/plain/" + did + "/bafkrei@jpeg",
+                    "viewer": {"muted": False, "blockedBy": False},
+                    "labels": [],
+                    "createdAt": "2024-01-01T00:00:00.000Z",
+                },
+                "record": {
+                    "$type": "app.bsky.feed.post",
+                    "text": "Final whistle: 3-1. What a second half from the away side " * 2,
+                    "createdAt": "2025-11-01T12:00:00.000Z",
+                    "langs": ["en"],
+                },
+                "embed": {
+                    "$type": "app.bsky.embed.external#view",
+                    "external": {
+                        "uri": "https://example.com/match-report",
+                        "title": "Match report",
+                        "description": "Everything that happened",
+                    },
+                },
+                "indexedAt": "2025-11-01T12:00:01.000Z",
+                "likeCount": i % 50,
+                "repostCount": i % 7,
+                "replyCount": i % 3,
+                "quoteCount": 0,
+                "viewer": {"threadMuted": False, "embeddingDisabled": False},
+                "labels": [],
+            }
+        }
+        feed.append(models.get_or_create(raw, models.AppBskyFeedDefs.FeedViewPost).post)
+    return feed
+
+
+def bench(fn, posts, repeat):
+    best = None
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(p) for p in posts]
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, sum(len(s) for s in out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--posts", type=int, default=200, help="posts per crawl (BSKY_HEAD_PAGES x 100)")
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    posts = make_feed(args.posts)
+    lean = include_spec(LEAN_FIELDS)
+    cases = [
+        ("old: model_dump + json.dumps", lambda p: json.dumps(as_primitive(p))),
+        ("lean: serialize_post (all fields)", lambda p: serialize_post(p, include=None)),
+        ("lean: serialize_post (LEAN_FIELDS)", lambda p: serialize_post(p, include=lean)),
+    ]
+    # the default (full dump) must store what the old path stored
+    assert all(json.loads(serialize_post(p, include=None)) == json.loads(json.dumps(as_primitive(p)))
+               for p in posts)
+    print(f"posts={args.posts} repeat={args.repeat}")
+    base = None
+    for name, fn in cases:
+        secs, nbytes = bench(fn, posts, args.repeat)
+        base = base or secs
+        print(f"{name:36s} {secs * 1000:8.2f} ms/crawl  {secs / args.posts * 1e6:7.1f} us/post  "
+              f"{nbytes / args.posts:7.0f} B/post  x{base / secs:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
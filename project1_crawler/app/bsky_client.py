@@ -1,6 +1,22 @@
-from typing import Optional, Tuple, List
+import time
+from typing import Optional, Tuple, List, Dict, Any
 from atproto import Client
 
+from config import BSKY_MAX_RPS, BSKY_429_RETRIES, BSKY_DATA_FIELDS
+from jsonutil import dumps_json
+from metrics import (
+    BSKY_RATE,
+    FETCH_SECONDS,
+    HTTP_RESPONSES,
+    HTTP_THROTTLED,
+    RATELIMIT_WAIT_SECONDS,
+)
+from ratelimit import AdaptiveRateLimiter
+
+# one budget for every actor crawled in this process
+LIMITER = AdaptiveRateLimiter(BSKY_MAX_RPS)
+BSKY_RATE.set_function(lambda: LIMITER.rate)
+
 # Small wrapper so worker code stays clean
 
 def get_bsky_client(handle: str, app_password: str) -> Client:
@@ -17,6 +33,51 @@ def get_author_feed(client: Client, actor: str, cursor: Optional[str] = None) ->
     next_cursor = getattr(resp, 'cursor', None)
     return list(resp.feed or []), next_cursor
 
+def _on_response(r) -> None:
+    LIMITER.observe(r.headers)
+    HTTP_RESPONSES.inc(source="bsky", code=str(r.status_code))
+    if r.status_code == 429:
+        HTTP_THROTTLED.inc(source="bsky")
+
+def _watch_rate_limit_headers(client: Client) -> None:
+    # atproto talks to the PDS through an httpx.Client; hook its responses
+    # so every call (not just ours) updates the shared limiter and the
+    # response counters
+    if getattr(client, "_ratelimit_hooked", False):
+        return
+    http = getattr(getattr(client, "request", None), "_client", None)
+    hooks = getattr(http, "event_hooks", None)
+    if hooks is not None:
+        hooks.setdefault("response", []).append(_on_response)
+        http.event_hooks = hooks
+    client._ratelimit_hooked = True
+
+def get_author_feed_limited(client: Client, actor: str, cursor: Optional[str] = None,
+                            retries: int = BSKY_429_RETRIES) -> Tuple[List[object], Optional[str]]:
+    """
+    get_author_feed behind the shared AdaptiveRateLimiter.
+    A 429 pauses every caller until the server's reset and is retried
+    instead of failing the job.
+    """
+    _watch_rate_limit_headers(client)
+    attempt = 0
+    while True:
+        RATELIMIT_WAIT_SECONDS.inc(LIMITER.acquire(), source="bsky")
+        t0 = time.monotonic()
+        try:
+            return get_author_feed(client, actor, cursor)
+        except Exception as e:
+            resp = getattr(e, "response", None)
+            if resp is None:
+                # never got an answer (timeout, DNS, TLS)
+                HTTP_RESPONSES.inc(source="bsky", code="error")
+            if getattr(resp, "status_code", None) != 429 or attempt >= retries:
+                raise
+            LIMITER.on_throttled(getattr(resp, "headers", None), attempt)
+            attempt += 1
+        finally:
+            FETCH_SECONDS.observe(time.monotonic() - t0, kind="feed")
+
 def as_primitive(obj):
     """Return a JSON-serializable structure for Pydantic models."""
     if obj is None:
@@ -29,3 +90,48 @@ def as_primitive(obj):
         return obj.__dict__
     except Exception:
         return str(obj)
+
+def include_spec(fields: str) -> Optional[Dict[str, Any]]:
+    """
+    'uri,author.did,author.handle' -> {'uri': True, 'author': {'did': True, 'handle': True}}
+    (pydantic include= format). '*' or empty -> None, i.e. every field.
+    """
+    fields = (fields or "").strip()
+    if not fields or fields == "*":
+        return None
+    spec: Dict[str, Any] = {}
+    for path in (f.strip() for f in fields.split(",")):
+        if not path:
+            continue
+        node = spec
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is True:
+                break  # parent already included whole
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return spec
+
+POST_INCLUDE = include_spec(BSKY_DATA_FIELDS)
+# a projection for BSKY_DATA_FIELDS that keeps what the analysis reads
+# (drops author avatars/viewer state, post viewer state, threadgate)
+LEAN_FIELDS = ("uri,cid,author.did,author.handle,author.display_name,record,embed,"
+               "indexed_at,like_count,repost_count,reply_count,quote_count,labels")
+
+def serialize_post(obj, include: Optional[Dict[str, Any]] = POST_INCLUDE) -> str:
+    """
+    JSON text for posts_bsky.data, encoded exactly once by pydantic's own
+    serializer. Without a projection this is the full model_dump (the shape
+    rows have always had); with one (BSKY_DATA_FIELDS) only those fields
+    are kept and None fields are dropped too.
+    db.insert_bsky_posts passes strings through untouched.
+    """
+    if obj is None:
+        return "null"
+    if hasattr(obj, "model_dump_json"):
+        if include is None:
+            return obj.model_dump_json()
+        return obj.model_dump_json(include=include, exclude_none=True)
+    return dumps_json(as_primitive(obj))
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Streaming Bluesky ingest: follow Jetstream for app.bsky.feed.post creates by
+the configured actors instead of polling each author feed.
+
+    python bsky_stream.py                      # live Jetstream
+    python bsky_stream.py --record events.jsonl  # live, and keep a copy of every event
+    python bsky_stream.py --replay events.jsonl  # offline, from a recorded file
+
+Matching posts are batched into db.insert_bsky_posts and the Jetstream
+cursor (event time_us) is saved in the state store after each flush, so a
+restart resumes where it stopped. Rows have the same data shape as polled
+ones (a PostView dump, see event_to_row), but created_at is the Jetstream
+event time, not the AppView indexed_at. A post stored by both is still one
+row (posts_bsky dedupes on uri), and each flush records in the actor's
+bsky_watermark what the stream has covered, in fields of its own, so a
+poll job that runs after the stream (or instead of it, once the stream
+dies) can stop there (see stream_floor). While this process is healthy it
+writes a heartbeat; with BSKY_INGEST_MODE=stream the producer stops queueing Bluesky
+poll jobs only as long as that heartbeat is fresh, so polling takes over if
+the stream dies.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterator, Optional, Set
+
+from atproto import models
+
+from logutil import get_logger
+from config import (
+    DATABASE_URL,
+    DB_BULK_COPY,
+    BSKY_ACTORS,
+    BSKY_HANDLE,
+    BSKY_APP_PASSWORD,
+    JETSTREAM_URL,
+    BSKY_STREAM_BATCH_SIZE,
+    BSKY_STREAM_FLUSH_SECONDS,
+    STATE_DB_PATH,
+)
+from db import get_pool, insert_bsky_posts
+from bsky_client import serialize_post
+from state import get_state_store, StateStore
+
+logger = get_logger("bsky_stream")
+
+POST_COLLECTION = "app.bsky.feed.post"
+NS = "bsky_stream"
+# rewind this much on reconnect; duplicates are dropped by ON CONFLICT
+REWIND_US = 5_000_000
+# how long recv() may sit idle before we yield a keepalive tick
+IDLE_TICK_SECONDS = 30
+# how far a post's AppView indexed_at may trail its Jetstream event time
+INDEX_SKEW = timedelta(minutes=5)
+# compare_and_set attempts per actor before a flush leaves the watermark be
+WATERMARK_TRIES = 3
+
+
+def heartbeat_age(store: StateStore) -> Optional[float]:
+    """Seconds since the stream last flushed, None if it never ran."""
+    raw = store.get(NS, "heartbeat")
+    return time.time() - float(raw) if raw else None
+
+
+def resolve_dids(actors) -> Dict[str, str]:
+    """handle -> DID for every configured actor (unresolvable ones are skipped)."""
+    from bsky_client_cached import get_bsky_client
+
+    client = get_bsky_client(BSKY_HANDLE, BSKY_APP_PASSWORD)
+    did_to_actor = {}
+    for actor in actors:
+        try:
+            resp = client.com.atproto.identity.resolve_handle({"handle": actor})
+            did_to_actor[resp.did] = actor
+        except Exception as e:
+            logger.warning(f"stream: cannot resolve actor={actor}: {e}")
+    return did_to_actor
+
+
+class JetstreamSource:
+    """Live events from a Jetstream instance, filtered server-side to our DIDs."""
+
+    def __init__(self, url: str, dids, cursor: Optional[int] = None, record_path: Optional[str] = None):
+        self.url = url
+        self.dids = list(dids)
+        self.cursor = cursor
+        self.record_path = record_path
+
+    def _subscribe_url(self) -> str:
+        params = [f"wantedCollections={POST_COLLECTION}"]
+        params += [f"wantedDids={d}" for d in self.dids]
+        if self.cursor:
+            params.append(f"cursor={max(0, self.cursor - REWIND_US)}")
+        return f"{self.url}?{'&'.join(params)}"
+
+    def __iter__(self) -> Iterator[dict]:
+        try:
+            import websocket
+        except ImportError:
+            raise RuntimeError("websocket-client is required for live streaming (pip install websocket-client)")
+
+        record = open(self.record_path, "a", encoding="utf-8") if self.record_path else None
+        backoff = 1.0
+        try:
+            while True:
+                try:
+                    ws = websocket.create_connection(self._subscribe_url(), timeout=IDLE_TICK_SECONDS)
+                except Exception as e:
+                    logger.warning(f"stream: connect failed: {e}; retry in {backoff:.0f}s")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60.0)
+                    continue
+                backoff = 1.0
+                try:
+                    while True:
+                        try:
+                            msg = ws.recv()
+                        except websocket.WebSocketTimeoutException:
+                            # quiet stream: let the consumer flush its heartbeat
+                            yield {}
+                            continue
+                        if record is not None:
+                            record.write(msg.rstrip("\n") + "\n")
+                        event = json.loads(msg)
+                        self.cursor = event.get("time_us", self.cursor)
+                        yield event
+                except Exception as e:
+                    logger.warning(f"stream: connection lost: {e}; reconnecting")
+                finally:
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+        finally:
+            if record is not None:
+                record.close()
+
+
+class ReplaySource:
+    """Events from a recorded JSONL file (one Jetstream message per line)."""
+
+    def __init__(self, path: str, dids=None):
+        self.path = path
+        self.dids = set(dids) if dids else None
+
+    def __iter__(self) -> Iterator[dict]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                # Jetstream filters DIDs server-side; do the same here
+                if self.dids is not None and event.get("did") not in self.dids:
+                    continue
+                yield event
+
+
+def event_to_row(event: dict, did_to_actor: Dict[str, str]) -> Optional[dict]:
+    """posts_bsky row for a post-create event by one of our actors, else None."""
+    if event.get("kind") != "commit":
+        return None
+    commit = event.get("commit") or {}
+    if commit.get("operation") != "create" or commit.get("collection") != POST_COLLECTION:
+        return None
+    did = event.get("did")
+    actor = did_to_actor.get(did)
+    if actor is None:
+        return None
+
+    record = commit.get("record") or {}
+    uri = f"at://{did}/{POST_COLLECTION}/{commit.get('rkey')}"
+    event_at = datetime.fromtimestamp(int(event.get("time_us", 0)) / 1e6, tz=timezone.utc)
+    # the PostView the AppView would return, minus the counters and the
+    # hydrated embed view, so data is dumped exactly like a polled post
+    # (snake_case keys, py_type). indexed_at is the event time
+    try:
+        view = models.AppBskyFeedDefs.PostView(
+            uri=uri,
+            cid=commit.get("cid"),
+            author=models.AppBskyActorDefs.ProfileViewBasic(did=did, handle=actor),
+            record=models.get_or_create(record, strict=False),
+            indexed_at=event_at.isoformat(),
+        )
+    except Exception as e:
+        logger.warning(f"stream: skipping malformed post uri={uri}: {e}")
+        return None
+    return {
+        "actor": actor,
+        "uri": uri,
+        "created_at": event_at,
+        "data": serialize_post(view),
+        "stance": None,
+        "like_count": None,
+        "repost_count": None,
+        "has_media": bool(record.get("embed")),
+    }
+
+
+def _parse_dt(raw) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def stream_floor(wm: dict) -> Optional[datetime]:
+    """
+    indexed_at below which the poller can stop for an actor whose
+    bsky_watermark is wm, because the stream stored those posts; None if
+    the stream cannot vouch for anything. The stream's times are event
+    times (INDEX_SKEW early or late against indexed_at), and it only covers
+    what it saw since stream_since: if the poller's own watermark is older
+    than that, posts in between were stored by neither.
+    """
+    since = _parse_dt(wm.get("stream_since"))
+    stream_at = _parse_dt(wm.get("stream_at"))
+    polled_at = _parse_dt(wm.get("indexed_at"))
+    if since is None or stream_at is None or polled_at is None:
+        return None
+    if polled_at < since - INDEX_SKEW:
+        return None
+    return stream_at - INDEX_SKEW
+
+
+def advance_watermarks(store: StateStore, rows, restart: Optional[Set[str]] = None) -> int:
+    """
+    Record the newest of rows in each actor's bsky_watermark as stream_at /
+    stream_uri (event time; the poller's indexed_at / uri are left alone).
+    stream_since, where this stretch of coverage began, is set the first
+    time, and again for actors in restart (which are then removed from it).
+    Returns actors moved.
+    """
+    newest, oldest = {}, {}
+    for r in rows:
+        a = r["actor"]
+        if a not in newest or r["created_at"] > newest[a]["created_at"]:
+            newest[a] = r
+        if a not in oldest or r["created_at"] < oldest[a]:
+            oldest[a] = r["created_at"]
+    moved = 0
+    for actor, r in newest.items():
+        for _ in range(WATERMARK_TRIES):
+            wm_raw = store.get("bsky_watermark", actor)
+            wm = json.loads(wm_raw) if wm_raw else {}
+            stream_at = _parse_dt(wm.get("stream_at"))
+            wm["stream_at"] = max(stream_at or r["created_at"], r["created_at"]).isoformat()
+            if stream_at is None or r["created_at"] > stream_at:
+                wm["stream_uri"] = r["uri"]
+            if "stream_since" not in wm or (restart and actor in restart):
+                wm["stream_since"] = oldest[actor].isoformat()
+            # a poll job may move indexed_at meanwhile: read it again and retry
+            if store.compare_and_set("bsky_watermark", actor, wm_raw, json.dumps(wm)):
+                if restart:
+                    restart.discard(actor)
+                moved += 1
+                break
+    return moved
+
+
+def run_stream(source, did_to_actor: Dict[str, str], store: StateStore,
+               batch_size: int = BSKY_STREAM_BATCH_SIZE,
+               flush_seconds: float = BSKY_STREAM_FLUSH_SECONDS,
+               ns: str = NS) -> Dict[str, int]:
+    """
+    Consume source until it ends, flushing batches to Postgres. Cursor and
+    heartbeat go to the state store under ns.
+    """
+    pool = get_pool(DATABASE_URL)
+    # without a saved cursor this run does not continue the last one, so
+    # each actor's coverage starts again at its first flush
+    restart = None if getattr(source, "cursor", None) else set(did_to_actor.values())
+    batch = []
+    last_cursor = None
+    last_flush = time.monotonic()
+    totals = {"events": 0, "rows": 0, "inserted": 0}
+
+    def flush():
+        nonlocal batch, last_flush
+        if batch:
+            with pool.connection() as conn:
+                totals["inserted"] += insert_bsky_posts(conn, batch, copy=DB_BULK_COPY)
+            totals["rows"] += len(batch)
+            # the poller can skip what the stream stored (live run only:
+            # a replay must not move it either)
+            if ns == NS:
+                advance_watermarks(store, batch, restart)
+        # cursor only moves once its rows are committed
+        items = {"heartbeat": str(time.time())}
+        if last_cursor is not None:
+            items["cursor"] = str(last_cursor)
+        store.put_many(ns, items)
+        if batch:
+            logger.info(f"stream: flushed rows={len(batch)} totals={totals} cursor={last_cursor}")
+        batch = []
+        last_flush = time.monotonic()
+
+    for event in source:
+        if event:
+            totals["events"] += 1
+        row = event_to_row(event, did_to_actor)
+        if row is not None:
+            batch.append(row)
+        t_us = event.get("time_us")
+        if t_us is not None and (last_cursor is None or t_us > last_cursor):
+            last_cursor = t_us
+        if len(batch) >= batch_size or time.monotonic() - last_flush >= flush_seconds:
+            flush()
+    flush()
+    return totals
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--replay", help="read events from a recorded JSONL file instead of Jetstream")
+    ap.add_argument("--record", help="append every live event to this JSONL file")
+    ap.add_argument("--dids", help="comma-separated did=handle pairs (skips handle resolution)")
+    args = ap.parse_args()
+
+    store = get_state_store(STATE_DB_PATH)
+
+    if args.dids:
+        did_to_actor = dict(p.split("=", 1) for p in args.dids.split(",") if "=" in p)
+    else:
+        did_to_actor = resolve_dids(BSKY_ACTORS)
+    if not did_to_actor:
+        raise SystemExit("bsky_stream: no actor DIDs to follow")
+    logger.info(f"stream: following {len(did_to_actor)} actors")
+
+    if args.replay:
+        source = ReplaySource(args.replay, did_to_actor.keys())
+    else:
+        cursor = store.get(NS, "cursor")
+        source = JetstreamSource(JETSTREAM_URL, did_to_actor.keys(),
+                                 int(cursor) if cursor else None, args.record)
+
+    # a replay must not move the live cursor or fake a healthy heartbeat
+    totals = run_stream(source, did_to_actor, store, ns=f"{NS}_replay" if args.replay else NS)
+    logger.info(f"stream: done {totals}")
+
+
+if __name__ == "__main__":
+    main()
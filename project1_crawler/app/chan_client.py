@@ -1,16 +1,150 @@
+import os
+import threading
+import time
+from email.utils import formatdate
+from typing import Dict, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    CHAN_MAX_RPS,
+    CHAN_MAX_BURST,
+    CHAN_MAX_INFLIGHT,
+    CHAN_POOL_SIZE,
+    CHAN_HTTP_RETRIES,
+    CHAN_HTTP_BACKOFF,
+)
+from metrics import FETCH_SECONDS, HTTP_RESPONSES, HTTP_THROTTLED, RATELIMIT_WAIT_SECONDS
+from ratelimit import RateLimiter
 
 BASE = "https://a.4cdn.org"
 
+# one budget for every thread in this process
+LIMITER = RateLimiter(CHAN_MAX_RPS, CHAN_MAX_BURST)
+
+# one keep-alive session per process (rebuilt after fork)
+_SESSION: Optional[requests.Session] = None
+_SESSION_PID: Optional[int] = None
+_SESSION_LOCK = threading.Lock()
+
+def _build_session() -> requests.Session:
+    # the pool must hold at least as many sockets as we have fetches in flight,
+    # otherwise urllib3 opens and drops extra connections
+    size = max(CHAN_POOL_SIZE, CHAN_MAX_INFLIGHT)
+    # no adapter-level retries: every attempt, retries included, goes through
+    # LIMITER in _get
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return s
+
+def get_session() -> requests.Session:
+    global _SESSION, _SESSION_PID
+    pid = os.getpid()
+    if _SESSION is not None and _SESSION_PID == pid:
+        return _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_PID != pid:
+            _SESSION = _build_session()
+            _SESSION_PID = pid
+    return _SESSION
+
+def connection_stats() -> Dict[str, int]:
+    """
+    Requests sent vs. TCP/TLS connections opened by this process's session.
+    reused = requests that skipped a handshake.
+    """
+    stats = {"requests": 0, "connections": 0, "reused": 0}
+    s = _SESSION
+    if s is None or _SESSION_PID != os.getpid():
+        return stats
+    # the same adapter is mounted for http:// and https://
+    adapters = {id(a): a for a in s.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+    stats["reused"] = max(0, stats["requests"] - stats["connections"])
+    return stats
+
+def _count_status(code) -> None:
+    code = str(code) if code else "error"
+    HTTP_RESPONSES.inc(source="chan", code=code)
+    if code == "429":
+        HTTP_THROTTLED.inc(source="chan")
+
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+def _retry_delay(r: Optional[requests.Response], attempt: int) -> float:
+    backoff = CHAN_HTTP_BACKOFF * (2 ** attempt)
+    if r is not None:
+        try:
+            return max(float(r.headers.get("Retry-After")), backoff)
+        except (TypeError, ValueError):
+            pass
+    return backoff
+
+def _get(kind: str, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """
+    GET with up to CHAN_HTTP_RETRIES retries on 429/5xx and connection errors
+    (Retry-After honoured). Each attempt takes its own LIMITER token, so a
+    struggling server sees fewer requests, not more.
+    """
+    attempt = 0
+    while True:
+        RATELIMIT_WAIT_SECONDS.inc(LIMITER.acquire(), source="chan")
+        t0 = time.monotonic()
+        try:
+            r = get_session().get(url, headers=headers, timeout=20)
+        except requests.RequestException:
+            _count_status(None)
+            if attempt >= CHAN_HTTP_RETRIES:
+                raise
+            r = None
+        finally:
+            FETCH_SECONDS.observe(time.monotonic() - t0, kind=kind)
+        if r is not None:
+            _count_status(r.status_code)
+            if r.status_code not in _RETRY_STATUS or attempt >= CHAN_HTTP_RETRIES:
+                return r
+        time.sleep(_retry_delay(r, attempt))
+        attempt += 1
+
 def get_catalog(board: str):
     url = f"{BASE}/{board}/catalog.json"
-    r = requests.get(url, timeout=20)
+    r = _get("catalog", url)
     r.raise_for_status()
     return r.json()
 
-def get_thread(board: str, thread_no: int):
+def get_archive(board: str):
+    """Thread numbers in the board's archive, oldest first (boards without one: 404)."""
+    url = f"{BASE}/{board}/archive.json"
+    r = _get("archive", url)
+    r.raise_for_status()
+    return [int(no) for no in r.json()]
+
+def get_thread(board: str, thread_no: int, if_modified_since: Optional[int] = None):
+    """
+    Returns the thread JSON, or None when the server answers 304 for the
+    given If-Modified-Since (unix seconds). Safe to call from several threads.
+    """
     url = f"{BASE}/{board}/thread/{thread_no}.json"
-    r = requests.get(url, timeout=20)
+    headers = {}
+    if if_modified_since:
+        headers["If-Modified-Since"] = formatdate(if_modified_since, usegmt=True)
+    r = _get("thread", url, headers)
+    if r.status_code == 304:
+        return None
     if r.status_code == 404:
         raise RuntimeError("Thread archived")
     r.raise_for_status()
@@ -1,24 +1,334 @@
+import functools
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import Json
-from typing import List, Dict, Any
-from config import DATABASE_URL
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from jsonutil import dumps_json
+from metrics import DB_INSERT_SECONDS, DB_ROWS
+from partitions import ensure_partitions, forget as forget_partitions
+from config import (
+    DATABASE_URL,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_HEALTHCHECK_SECONDS,
+    DB_POOL_WAIT_TIMEOUT,
+)
+
+_4CHAN_COLS = ("board_name", "thread_number", "post_number", "created_at", "data", "has_media")
+_4CHAN_CONFLICT = "(board_name, thread_number, post_number, created_at)"
+_BSKY_COLS = ("actor", "uri", "created_at", "data", "stance", "like_count", "repost_count", "has_media")
+_BSKY_CONFLICT = "(uri, created_at)"
+# a post is one row whatever timestamp it arrived with (the poller stores the
+# AppView indexed_at, the Jetstream consumer the event time). A partitioned
+# table's unique keys must include created_at, so uniqueness of the uri is
+# kept in a separate table (migration 4) that each insert claims first
+_BSKY_KEY = "uri"
+_BSKY_REGISTRY = "bsky_uris"
 
 def get_conn(url: str = DATABASE_URL):
     return psycopg2.connect(url)
 
-def insert_4chan_posts(conn, rows: List[Dict[str, Any]]) -> int:
+class ConnectionPool:
+    """
+    Small thread-safe pool of psycopg2 connections for one DSN.
+
+    - at most max_size connections exist at once; callers wait up to
+      wait_timeout seconds for one to come back
+    - idle connections older than idle_timeout are closed
+    - connections idle longer than healthcheck_after get a SELECT 1
+      before being handed out
+    """
+
+    def __init__(self, url: str, max_size: int = DB_POOL_MAX_SIZE,
+                 idle_timeout: float = DB_POOL_IDLE_TIMEOUT,
+                 healthcheck_after: float = DB_POOL_HEALTHCHECK_SECONDS,
+                 wait_timeout: float = DB_POOL_WAIT_TIMEOUT):
+        self.url = url
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.healthcheck_after = healthcheck_after
+        self.wait_timeout = wait_timeout
+        self._idle: List[Tuple[Any, float]] = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "acquired": 0,
+            "created": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "closed_idle": 0,
+            "closed_broken": 0,
+        }
+
+    def _healthy(self, conn) -> bool:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn, reason: str) -> None:
+        # caller holds self._cond
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._size -= 1
+        self._stats[reason] += 1
+        self._cond.notify()
+
+    def getconn(self):
+        t0 = time.monotonic()
+        deadline = t0 + self.wait_timeout
+        waited = False
+        while True:
+            # only bookkeeping under the lock: connecting and health checks
+            # can take a network timeout, and must not hold up other threads
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(f"db pool exhausted (max_size={self.max_size})")
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    # reserve the slot; handed back below if the connect fails
+                    self._size += 1
+                    conn, last_used = None, None
+
+            if conn is None:
+                try:
+                    conn = psycopg2.connect(self.url)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+                    return self._checkout(conn, t0, waited)
+
+            idle_for = time.monotonic() - last_used
+            if conn.closed or idle_for > self.idle_timeout:
+                with self._cond:
+                    self._discard(conn, "closed_idle")
+                continue
+            if idle_for > self.healthcheck_after and not self._healthy(conn):
+                with self._cond:
+                    self._discard(conn, "closed_broken")
+                continue
+            with self._cond:
+                return self._checkout(conn, t0, waited)
+
+    def _checkout(self, conn, t0: float, waited: bool):
+        wait = time.monotonic() - t0
+        self._stats["acquired"] += 1
+        if waited:
+            self._stats["waits"] += 1
+        self._stats["wait_seconds_total"] += wait
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+        return conn
+
+    def putconn(self, conn) -> None:
+        broken = conn.closed
+        if not broken:
+            try:
+                # never hand out a connection with an open or failed transaction
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._cond:
+            if broken:
+                self._discard(conn, "closed_broken")
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out["size"] = self._size
+            out["idle"] = len(self._idle)
+            out["in_use"] = self._size - len(self._idle)
+            return out
+
+    def close(self) -> None:
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn, "closed_idle")
+
+_POOLS: Dict[str, ConnectionPool] = {}
+_POOLS_PID = os.getpid()
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(url: str = DATABASE_URL) -> ConnectionPool:
+    """Process-wide pool per DSN (a forked child starts with a fresh set)."""
+    global _POOLS_PID
+    with _POOLS_LOCK:
+        if _POOLS_PID != os.getpid():
+            # sockets inherited from the parent must not be reused
+            _POOLS.clear()
+            _POOLS_PID = os.getpid()
+        pool = _POOLS.get(url)
+        if pool is None:
+            pool = _POOLS[url] = ConnectionPool(url)
+        return pool
+
+def pooled_conn(url: str = DATABASE_URL):
+    """with pooled_conn() as conn: ...  borrows a connection from get_pool(url)."""
+    return get_pool(url).connection()
+
+def _copy_value(v: Any) -> str:
+    # COPY text format: \N is NULL, backslash/tab/newline must be escaped
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, (dict, list)):
+        v = dumps_json(v)
+    elif isinstance(v, datetime):
+        v = v.isoformat()
+    else:
+        v = str(v)
+    return (v.replace("\\", "\\\\")
+             .replace("\t", "\\t")
+             .replace("\n", "\\n")
+             .replace("\r", "\\r"))
+
+def _copy_merge(conn, table: str, cols: Sequence[str], conflict: str,
+                rows: List[Dict[str, Any]], key: Optional[str] = None,
+                registry: Optional[str] = None) -> int:
+    """
+    COPY rows into a session-local staging table, then merge them with one
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING. Returns rows actually inserted.
+    The staging table is emptied on commit, so conn must not be in autocommit.
+    registry: a table with a unique `key` column. The batch's keys are
+    inserted there first (in key order, so concurrent batches cannot
+    deadlock) and only rows whose key was new are merged, one per key.
+    """
+    stage = f"_stage_{table}"
+    col_list = ", ".join(cols)
+
+    buf = io.StringIO()
+    for r in rows:
+        buf.write("\t".join(_copy_value(r[c]) for c in cols))
+        buf.write("\n")
+    buf.seek(0)
+
+    cur = conn.cursor()
+    cur.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DELETE ROWS "
+        f"AS SELECT {col_list} FROM {table} WITH NO DATA"
+    )
+    cur.copy_expert(f"COPY {stage} ({col_list}) FROM STDIN", buf)
+    if registry is None:
+        claim = ""
+        source = f"SELECT {col_list} FROM {stage}"
+    else:
+        claim = (f"WITH fresh AS (INSERT INTO {registry} ({key}) "
+                 f"SELECT DISTINCT {key} FROM {stage} ORDER BY {key} "
+                 f"ON CONFLICT DO NOTHING RETURNING {key})")
+        source = f"SELECT DISTINCT ON ({key}) {col_list} FROM {stage} JOIN fresh USING ({key})"
+    cur.execute(
+        f"""
+        {claim}
+        INSERT INTO {table} ({col_list})
+        {source}
+        ON CONFLICT {conflict}
+        DO NOTHING
+        """
+    )
+    inserted = cur.rowcount
+    conn.commit()
+    cur.close()
+    return inserted
+
+def _json_param(data):
+    # pre-serialized JSON text (bsky_client.serialize_post) goes out as-is;
+    # anything else is encoded once here
+    if isinstance(data, str):
+        return data
+    return Json(data, dumps=dumps_json)
+
+def _instrumented(table: str):
+    # latency and offered/inserted row counts for every insert_*_posts call
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(conn, rows, copy: bool = False):
+            if not rows:
+                return fn(conn, rows, copy=copy)
+            t0 = time.monotonic()
+            inserted = fn(conn, rows, copy=copy)
+            DB_INSERT_SECONDS.observe(time.monotonic() - t0, table=table,
+                                      mode="copy" if copy else "executemany")
+            DB_ROWS.inc(len(rows), table=table, state="offered")
+            DB_ROWS.inc(max(inserted, 0), table=table, state="inserted")
+            return inserted
+        return inner
+    return wrap
+
+def _partitioned(table: str):
+    # partitioned tables (partitions.py): create any month/board partition the
+    # batch needs first; a plain table makes this a no-op after one lookup
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(conn, rows, copy: bool = False):
+            if not rows:
+                return fn(conn, rows, copy=copy)
+            ensure_partitions(conn, table, rows)
+            try:
+                return fn(conn, rows, copy=copy)
+            except psycopg2.errors.CheckViolation:
+                # "no partition found for row": a partition was retired under us
+                conn.rollback()
+                forget_partitions(table)
+                ensure_partitions(conn, table, rows)
+                return fn(conn, rows, copy=copy)
+        return inner
+    return wrap
+
+@_instrumented("posts_4chan")
+@_partitioned("posts_4chan")
+def insert_4chan_posts(conn, rows: List[Dict[str, Any]], copy: bool = False) -> int:
     """
+    copy=True streams the batch through COPY + merge instead of executemany.
+
     rows = [{
         "board_name": str,
         "thread_number": int,
         "post_number": int,
         "created_at": datetime,
-        "data": dict,
+        "data": dict | str (JSON text),
         "has_media": bool,
     }, ...]
     """
     if not rows:
         return 0
+    if copy:
+        return _copy_merge(conn, "posts_4chan", _4CHAN_COLS, _4CHAN_CONFLICT, rows)
 
     # wrap each row's "data" dict so psycopg2 can send it to jsonb
     db_rows = []
@@ -28,7 +338,7 @@ def insert_4chan_posts(conn, rows: List[Dict[str, Any]]) -> int:
             "thread_number": r["thread_number"],
             "post_number":   r["post_number"],
             "created_at":    r["created_at"],
-            "data":          Json(r["data"]),
+            "data":          _json_param(r["data"]),
             "has_media":     r["has_media"],
         })
 
@@ -50,13 +360,18 @@ def insert_4chan_posts(conn, rows: List[Dict[str, Any]]) -> int:
     cur.close()
     return inserted
 
-def insert_bsky_posts(conn, rows: List[Dict[str, Any]]) -> int:
+@_instrumented("posts_bsky")
+@_partitioned("posts_bsky")
+def insert_bsky_posts(conn, rows: List[Dict[str, Any]], copy: bool = False) -> int:
     """
+    copy=True streams the batch through COPY + merge instead of executemany.
+    Rows whose uri is already stored are skipped, whatever their created_at.
+
     rows = [{
         "actor": str,
         "uri": str,
         "created_at": datetime,
-        "data": dict,
+        "data": dict | str (JSON text),
         "stance": str|None,
         "like_count": int|None,
         "repost_count": int|None,
@@ -65,15 +380,19 @@ def insert_bsky_posts(conn, rows: List[Dict[str, Any]]) -> int:
     """
     if not rows:
         return 0
+    if copy:
+        return _copy_merge(conn, "posts_bsky", _BSKY_COLS, _BSKY_CONFLICT, rows,
+                           key=_BSKY_KEY, registry=_BSKY_REGISTRY)
 
-    # wrap JSON field
+    # wrap JSON field; uri order, like the COPY path, so that concurrent
+    # batches claim bsky_uris rows in the same order
     db_rows = []
-    for r in rows:
+    for r in sorted(rows, key=lambda r: r["uri"]):
         db_rows.append({
             "actor":         r["actor"],
             "uri":           r["uri"],
             "created_at":    r["created_at"],
-            "data":          Json(r["data"]),
+            "data":          _json_param(r["data"]),
             "stance":        r["stance"],
             "like_count":    r["like_count"],
             "repost_count":  r["repost_count"],
@@ -83,12 +402,17 @@ def insert_bsky_posts(conn, rows: List[Dict[str, Any]]) -> int:
     cur = conn.cursor()
     cur.executemany(
         """
+        WITH fresh AS (
+            INSERT INTO bsky_uris (uri) VALUES (%(uri)s)
+            ON CONFLICT DO NOTHING RETURNING uri
+        )
         INSERT INTO posts_bsky
             (actor, uri, created_at, data,
              stance, like_count, repost_count, has_media)
-        VALUES
-            (%(actor)s, %(uri)s, %(created_at)s, %(data)s,
-             %(stance)s, %(like_count)s, %(repost_count)s, %(has_media)s)
+        SELECT
+            %(actor)s, uri, %(created_at)s, %(data)s,
+            %(stance)s, %(like_count)s, %(repost_count)s, %(has_media)s
+        FROM fresh
         ON CONFLICT (uri, created_at)
         DO NOTHING
         """,
@@ -1,59 +1,93 @@
 import os
-import psycopg2
+import re
+from typing import Any, Dict, List
+
+from psycopg2.extras import execute_values
+
+from config import DB_BULK_COPY
+from db import pooled_conn, _copy_merge
 
 DSN = os.getenv("PG_DSN", "dbname=crawler user=postgres host=timescaledb")
 
-def _get_conn():
-    return psycopg2.connect(DSN)
+# one table per board: posts_4chan_<board>
+_COLS = ("board", "thread_id", "post_id", "author", "content", "created_at")
+_BOARD_RE = re.compile(r"^[a-z0-9]+$")
+# rows per INSERT statement on the VALUES path
+_PAGE_SIZE = 1000
 
-def insert_sp(posts):
-    if not posts:
-        return 0
-    conn = _get_conn()
+def table_for(board: str) -> str:
+    # the name ends up in SQL text, so only plain board names are allowed
+    if not _BOARD_RE.match(board or ""):
+        raise RuntimeError(f"Invalid board name: {board!r}")
+    return f"posts_4chan_{board}"
+
+def _row(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "board": p["board"],
+        "thread_id": p.get("thread_id"),
+        "post_id": p["post_id"],
+        "author": p.get("author"),
+        "content": p.get("content"),
+        "created_at": p["created_at"],
+    }
+
+def _insert_values(conn, table: str, rows: List[Dict[str, Any]]) -> int:
     cur = conn.cursor()
-    for p in posts:
-        cur.execute(
-            """
-            INSERT INTO posts_4chan_sp (board, thread_id, post_id, author, content, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
-            """,
-            (
-                p["board"],
-                p.get("thread_id"),
-                p["post_id"],
-                p.get("author"),
-                p.get("content"),
-                p["created_at"],
-            ),
-        )
+    # RETURNING + fetch: cur.rowcount would only cover the last page
+    returned = execute_values(
+        cur,
+        f"INSERT INTO {table} ({', '.join(_COLS)}) VALUES %s ON CONFLICT DO NOTHING RETURNING 1",
+        [tuple(r[c] for c in _COLS) for r in rows],
+        page_size=_PAGE_SIZE,
+        fetch=True,
+    )
     conn.commit()
     cur.close()
-    conn.close()
-    return len(posts)
+    return len(returned)
 
-def insert_pol(posts):
+def insert_board_posts(posts: List[Dict[str, Any]], copy: bool = DB_BULK_COPY, dsn: str = DSN) -> int:
+    """
+    Route posts to posts_4chan_<board> by their "board" key and batch-insert
+    them over one pooled connection, one commit per board. copy=True loads
+    each board through COPY + merge (db._copy_merge) instead of multi-row
+    VALUES. Returns rows actually inserted (duplicates not counted).
+
+    posts = [{
+        "board": str,
+        "thread_id": int|None,
+        "post_id": int,
+        "author": str|None,
+        "content": str|None,
+        "created_at": datetime,
+    }, ...]
+    """
     if not posts:
         return 0
-    conn = _get_conn()
-    cur = conn.cursor()
+    # every board is checked before anything is written, so one bad board
+    # name cannot leave the batch half applied
+    by_table: Dict[str, List[Dict[str, Any]]] = {}
     for p in posts:
-        cur.execute(
-            """
-            INSERT INTO posts_4chan_pol (board, thread_id, post_id, author, content, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
-            """,
-            (
-                p["board"],
-                p.get("thread_id"),
-                p["post_id"],
-                p.get("author"),
-                p.get("content"),
-                p["created_at"],
-            ),
-        )
-    conn.commit()
-    cur.close()
-    conn.close()
-    return len(posts)
+        by_table.setdefault(table_for(p["board"]), []).append(_row(p))
+    return _insert_tables(by_table, copy, dsn)
+
+def _insert_tables(by_table: Dict[str, List[Dict[str, Any]]], copy: bool, dsn: str) -> int:
+    inserted = 0
+    with pooled_conn(dsn) as conn:
+        for table, rows in by_table.items():
+            if copy:
+                inserted += _copy_merge(conn, table, _COLS, "", rows)
+            else:
+                inserted += _insert_values(conn, table, rows)
+    return inserted
+
+# old per-board entry points: every row goes to that board's table, whatever
+# its "board" key says (which is stored as given)
+def insert_sp(posts: List[Dict[str, Any]], copy: bool = DB_BULK_COPY, dsn: str = DSN) -> int:
+    if not posts:
+        return 0
+    return _insert_tables({table_for("sp"): [_row(p) for p in posts]}, copy, dsn)
+
+def insert_pol(posts: List[Dict[str, Any]], copy: bool = DB_BULK_COPY, dsn: str = DSN) -> int:
+    if not posts:
+        return 0
+    return _insert_tables({table_for("pol"): [_row(p) for p in posts]}, copy, dsn)
@@ -0,0 +1,13 @@
+import json
+
+# orjson is optional; it is several times faster than the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps_json(obj) -> str:
+    """Compact JSON text; anything not natively serializable goes through str()."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
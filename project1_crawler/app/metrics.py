@@ -0,0 +1,296 @@
+"""
+Process-local crawler metrics, served in the Prometheus text format.
+
+    from metrics import FETCH_SECONDS
+    FETCH_SECONDS.observe(0.21, kind="thread")
+
+worker.py calls start_http_server(METRICS_PORT) so GET /metrics on that port
+returns every metric below. Updating a metric without a server running is
+just a dict update under a lock, so db.py and the clients record
+unconditionally.
+"""
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from logutil import get_logger
+
+logger = get_logger("metrics")
+
+# seconds; spans a local COPY (ms) up to a 429-throttled crawl job (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_REGISTRY: List["_Metric"] = []
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        with _REGISTRY_LOCK:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: expected labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labels, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Either set() explicitly or read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        super().__init__(name, doc, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return [f"{self.name}{_label_str(self.labels, k)} {_fmt(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (non-cumulative) + overflow, sum]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._series.items())
+        out = []
+        for key, (counts, total) in items:
+            cum = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {cum}")
+            out.append(f"{self.name}_sum{_label_str(self.labels, key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_label_str(self.labels, key)} {cum}")
+        return out
+
+
+def render() -> str:
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY)
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- the crawler's metrics ----------
+
+FETCH_SECONDS = Histogram(
+    "crawler_fetch_seconds",
+    "Upstream request latency (kind=catalog|thread|archive|feed), rate-limit wait excluded.",
+    ["kind"],
+)
+RATELIMIT_WAIT_SECONDS = Counter(
+    "crawler_ratelimit_wait_seconds_total",
+    "Time spent waiting on the local rate limiter (source=chan|bsky).",
+    ["source"],
+)
+HTTP_RESPONSES = Counter(
+    "crawler_http_responses_total",
+    "Upstream responses by status code, retried attempts included; code=error for transport failures.",
+    ["source", "code"],
+)
+HTTP_THROTTLED = Counter(
+    "crawler_http_throttled_total",
+    "HTTP 429 responses (source=chan|bsky).",
+    ["source"],
+)
+DB_INSERT_SECONDS = Histogram(
+    "crawler_db_insert_seconds",
+    "Latency of one insert_*_posts call, commit included.",
+    ["table", "mode"],
+)
+DB_ROWS = Counter(
+    "crawler_db_rows_total",
+    "Rows handed to insert_*_posts (state=offered) and actually inserted (state=inserted).",
+    ["table", "state"],
+)
+ROWS_STORED = Counter(
+    "crawler_rows_stored_total",
+    "New rows per crawl source (source=chan|bsky, name=board|actor); rate() gives rows/sec.",
+    ["source", "name"],
+)
+STORE_SECONDS = Histogram(
+    "crawler_store_seconds",
+    "Latency of one crawl job's insert_*_posts call or spool append (source=chan|bsky, name=board|actor).",
+    ["source", "name"],
+)
+JOB_SECONDS = Histogram(
+    "crawler_job_seconds",
+    "Crawl job duration.",
+    ["job"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200),
+)
+JOBS = Counter(
+    "crawler_jobs_total",
+    "Crawl jobs finished (status=ok|error).",
+    ["job", "status"],
+)
+DB_POOL = Gauge(
+    "crawler_db_pool_connections",
+    "Postgres pool connections (state=size|idle|in_use).",
+    ["state"],
+)
+BSKY_RATE = Gauge(
+    "crawler_bsky_rate_limit_rps",
+    "Current rate of the adaptive Bluesky limiter.",
+)
+
+
+@contextmanager
+def track_job(job: str):
+    """Time a crawl job and count it as ok or error."""
+    t0 = time.monotonic()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        JOB_SECONDS.observe(time.monotonic() - t0, job=job)
+        JOBS.inc(job=job, status=status)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        # scrapes every few seconds would drown the crawl logs
+        pass
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+
+
+def start_http_server(port: int, addr: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread. port <= 0 disables it."""
+    global _SERVER
+    if port <= 0:
+        return None
+    if _SERVER is not None:
+        return _SERVER
+    try:
+        server = ThreadingHTTPServer((addr, port), _Handler)
+    except OSError as e:
+        # another worker on this host owns the port; crawling matters more
+        logger.warning(f"cannot serve metrics on {addr}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    _SERVER = server
+    logger.info(f"serving /metrics on {addr}:{port}")
+    return server
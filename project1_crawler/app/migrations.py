@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Versioned schema for posts_4chan / posts_bsky.
+
+    python migrations.py                 # apply pending migrations
+    python migrations.py status          # applied / pending versions
+    python migrations.py check           # EXPLAIN the dashboard queries, flag seq scans
+    python migrations.py check --analyze --strict
+
+Applied versions are recorded in schema_migrations. Every statement is
+idempotent (IF NOT EXISTS), so an existing database adopts the history
+without changes: version 1 is a no-op where the tables already exist.
+Index migrations run CREATE INDEX CONCURRENTLY outside a transaction, so
+the crawlers keep inserting while they build.
+
+Postgres refuses CONCURRENTLY on a partitioned table, which posts_4chan and
+posts_bsky become after partitions.py convert. For those the index is
+created ON ONLY the parent (invalid, no data), each partition gets its own
+index CONCURRENTLY (recursing into board sub-partitions), and every one is
+ATTACHed; the parent index turns valid once all partitions are attached.
+A run that stops halfway picks up from there: the parent index is kept and
+only missing partition indexes are built. Partitions created later inherit
+the index by themselves.
+
+The check EXPLAINs the SQL built by project3_dashboard/queries.py (see
+DASHBOARD_DIR). It only means something on a populated, ANALYZEd database:
+on a near-empty table the planner prefers a seq scan whatever indexes
+exist, so such scans are reported as not judged rather than passed.
+"""
+import argparse
+import json
+import re
+import sys
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from config import DATABASE_URL, DASHBOARD_DIR
+from db import get_conn
+from logutil import get_logger
+
+logger = get_logger("migrations")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: Sequence[str]
+    # False = autocommit, one statement at a time (needed for CONCURRENTLY)
+    transactional: bool = True
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "posts tables", [
+        """
+        CREATE TABLE IF NOT EXISTS posts_4chan (
+            id            BIGSERIAL,
+            board_name    TEXT        NOT NULL,
+            thread_number BIGINT      NOT NULL,
+            post_number   BIGINT      NOT NULL,
+            created_at    TIMESTAMPTZ NOT NULL,
+            data          JSONB       NOT NULL,
+            has_media     BOOLEAN,
+            UNIQUE (board_name, thread_number, post_number, created_at)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS posts_bsky (
+            id            BIGSERIAL,
+            actor         TEXT,
+            uri           TEXT        NOT NULL,
+            created_at    TIMESTAMPTZ NOT NULL,
+            data          JSONB,
+            stance        TEXT,
+            like_count    INTEGER,
+            repost_count  INTEGER,
+            has_media     BOOLEAN,
+            UNIQUE (uri, created_at)
+        )
+        """,
+    ]),
+    Migration(2, "time and board indexes", [
+        # per-board counts and time windows (dashboard stats, event spikes, LDA)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_4chan_board_created_idx "
+        "ON posts_4chan (board_name, created_at)",
+        # both tables are append-only in created_at order, so a BRIN index
+        # answers time-range scans at a few pages per million rows
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_4chan_created_brin "
+        "ON posts_4chan USING brin (created_at) WITH (pages_per_range = 32)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_bsky_created_brin "
+        "ON posts_bsky USING brin (created_at) WITH (pages_per_range = 32)",
+        # posts_bsky is small enough for a btree too: MAX(created_at) and
+        # ORDER BY created_at need one, BRIN cannot do either
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_bsky_created_idx "
+        "ON posts_bsky (created_at)",
+    ], transactional=False),
+    Migration(3, "jsonb expression indexes", [
+        # LDA: board + time range + data->>'com' IS NOT NULL. Partial on the
+        # expression rather than a btree on the text itself, which would
+        # fail on posts longer than the btree row limit
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_4chan_com_board_created_idx "
+        "ON posts_4chan (board_name, created_at) WHERE (data->>'com') IS NOT NULL",
+        # media engagement over Bluesky only reads rows that have counters
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_bsky_counted_idx "
+        "ON posts_bsky (has_media) INCLUDE (like_count, repost_count) WHERE like_count IS NOT NULL",
+    ], transactional=False),
+    Migration(4, "bsky uri registry", [
+        # one row per stored Bluesky post: db.insert_bsky_posts claims the uri
+        # here before inserting, since posts_bsky itself can only be unique on
+        # (uri, created_at) and the poller and the stream disagree on created_at
+        "CREATE TABLE IF NOT EXISTS bsky_uris (uri TEXT PRIMARY KEY)",
+        "INSERT INTO bsky_uris (uri) SELECT DISTINCT uri FROM posts_bsky ON CONFLICT DO NOTHING",
+    ]),
+]
+
+
+def _ensure_table(conn) -> None:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    INTEGER PRIMARY KEY,
+            name       TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    )
+    conn.commit()
+    cur.close()
+
+
+def applied_versions(conn) -> Dict[int, str]:
+    _ensure_table(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT version, name FROM schema_migrations ORDER BY version")
+    out = {v: n for v, n in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return out
+
+
+_CONCURRENT_INDEX_RE = re.compile(
+    r"^\s*CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+) ON (\w+) (.*)$", re.S)
+
+
+def _drop_invalid_index(cur, name: str) -> None:
+    # a failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS
+    # would then happily skip; drop it so the retry rebuilds it. A
+    # partitioned index is invalid until all partitions are attached, which
+    # _partitioned_index finishes instead
+    cur.execute(
+        """
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid AND c.relkind = 'i'
+        """,
+        (name,),
+    )
+    if cur.fetchone():
+        logger.warning(f"dropping invalid index {name} left by an earlier build")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def _is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def _partitioned_index(cur, name: str, table: str, spec: str) -> None:
+    """name ON table spec, for a partitioned table, without locking out inserts."""
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {spec}")
+    cur.execute(
+        """
+        SELECT c.relname, c.relkind = 'p' FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname
+        """,
+        (table,),
+    )
+    for child, sub in cur.fetchall():
+        # posts_bsky_created_idx on posts_bsky_y2025m11 -> posts_bsky_y2025m11_created_idx
+        suffix = name[len(table) + 1:] if name.startswith(table + "_") else name
+        child_name = f"{child}_{suffix}"[:63]
+        cur.execute(
+            """
+            SELECT 1 FROM pg_inherits
+            WHERE inhparent = to_regclass(%s) AND inhrelid = to_regclass(%s)
+            """,
+            (name, child_name),
+        )
+        if cur.fetchone():
+            continue
+        if sub:
+            _partitioned_index(cur, child_name, child, spec)
+        else:
+            _drop_invalid_index(cur, child_name)
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child_name} ON {child} {spec}")
+        cur.execute(f"ALTER INDEX {name} ATTACH PARTITION {child_name}")
+
+
+def _run_concurrent(cur, stmt: str) -> None:
+    m = _CONCURRENT_INDEX_RE.match(stmt)
+    if m is None:
+        cur.execute(stmt)
+        return
+    name, table, spec = m.groups()
+    if _is_partitioned(cur, table):
+        _partitioned_index(cur, name, table, spec)
+    else:
+        _drop_invalid_index(cur, name)
+        cur.execute(stmt)
+
+
+def apply(conn, m: Migration) -> None:
+    cur = conn.cursor()
+    if m.transactional:
+        for stmt in m.statements:
+            cur.execute(stmt)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (m.version, m.name))
+        conn.commit()
+    else:
+        conn.autocommit = True
+        try:
+            for stmt in m.statements:
+                _run_concurrent(cur, stmt)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (m.version, m.name))
+        finally:
+            conn.autocommit = False
+    cur.close()
+
+
+def migrate(conn, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to target (default: all). Returns versions applied."""
+    done = applied_versions(conn)
+    ran = []
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        if m.version in done or (target is not None and m.version > target):
+            continue
+        logger.info(f"applying {m.version}: {m.name}")
+        apply(conn, m)
+        ran.append(m.version)
+    return ran
+
+
+# ---------- EXPLAIN check ----------
+
+class FeatureQuery(NamedTuple):
+    name: str
+    sql: str
+    # reason a full scan is inherent to the query (None = it should use an index)
+    seq_ok: Optional[str] = None
+
+
+def feature_queries() -> List[FeatureQuery]:
+    """
+    The queries project3_dashboard runs, built by its own queries.py (found
+    in DASHBOARD_DIR) with representative parameters.
+    """
+    if not (DASHBOARD_DIR / "queries.py").is_file():
+        raise RuntimeError(f"no queries.py in DASHBOARD_DIR={DASHBOARD_DIR}; set it to the project3_dashboard checkout")
+    if str(DASHBOARD_DIR) not in sys.path:
+        sys.path.insert(0, str(DASHBOARD_DIR))
+    import queries as q
+
+    return [
+        FeatureQuery("stats: count per board", q.count_query("sp"),
+                     "counts every post of the board; a board sub-partition is read whole"),
+        FeatureQuery("stats: count bsky", q.count_query("bsky"), "counts the whole table"),
+        FeatureQuery("live: last 4chan post", q.latest_post_query("posts_4chan"),
+                     "no board filter; BRIN cannot answer MAX, use the per-board index if this gets hot"),
+        FeatureQuery("live: last bsky post", q.latest_post_query("posts_bsky")),
+        FeatureQuery("live: 4chan last hour", q.recent_count_query("posts_4chan", "1 hour")),
+        FeatureQuery("live: bsky last 24h", q.recent_count_query("posts_bsky", "24 hours")),
+        FeatureQuery("event spike: hourly per board",
+                     q.hourly_activity_query("sp", "2025-11-01", "2025-11-08")),
+        FeatureQuery("event spike: day phases bsky",
+                     q.event_comparison_query("bsky", "2025-11-09 00:00:00", "2025-11-10 00:00:00")),
+        FeatureQuery("event spike: date range", q.available_dates_query("sp"),
+                     "MIN/MAX of DATE(created_at) over the board"),
+        FeatureQuery("lda: 4chan comments", q.platform_text_query("sp", "2025-11-01", "2025-11-15", 50000)),
+        FeatureQuery("lda: bsky text", q.platform_text_query("bsky", "2025-11-01", "2025-11-15", 50000)),
+        FeatureQuery("media: thread sizes", q.media_engagement_4chan_query("sp"),
+                     "aggregates every post of the board"),
+        FeatureQuery("media: bsky engagement", q.MEDIA_ENGAGEMENT_BSKY_QUERY,
+                     "aggregates every post with counters"),
+    ]
+
+
+# seq scans of relations under this many 8kB pages are not judged: the
+# planner reads a small table whole whatever its indexes
+_SEQ_MIN_PAGES = 128
+
+
+def _seq_scans(plan: Dict) -> List[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def check_queries(conn, analyze: bool = False) -> List[Dict]:
+    """
+    EXPLAIN every feature query; one result dict per query. Seq scans of
+    relations under _SEQ_MIN_PAGES are listed under "small", not flagged.
+    """
+    results = []
+    cur = conn.cursor()
+    opts = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    for q in feature_queries():
+        cur.execute(f"EXPLAIN ({opts}) {q.sql}")
+        raw = cur.fetchone()[0]
+        doc = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        seq = _seq_scans(doc["Plan"])
+        small = []
+        if seq:
+            # a fresh month partition is read whole whatever its indexes; only
+            # flag scans of relations big enough to matter
+            cur.execute(
+                "SELECT relname FROM pg_class WHERE relname = ANY(%s) "
+                "AND pg_relation_size(oid) < %s * current_setting('block_size')::int",
+                (seq, _SEQ_MIN_PAGES),
+            )
+            small = sorted({r[0] for r in cur.fetchall()})
+            seq = [r for r in seq if r not in small]
+        results.append({
+            "name": q.name,
+            "seq_scans": seq,
+            "small": small,
+            "flagged": bool(seq) and q.seq_ok is None,
+            "seq_ok": q.seq_ok,
+            "cost": doc["Plan"].get("Total Cost"),
+            "ms": doc.get("Execution Time"),
+        })
+    conn.rollback()
+    cur.close()
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", nargs="?", default="migrate", choices=("migrate", "status", "check"))
+    ap.add_argument("--target", type=int, help="migrate up to this version")
+    ap.add_argument("--analyze", action="store_true", help="check: EXPLAIN ANALYZE (runs the queries)")
+    ap.add_argument("--strict", action="store_true", help="check: exit 1 if any query is flagged")
+    args = ap.parse_args()
+
+    conn = get_conn(DATABASE_URL)
+    try:
+        if args.command == "migrate":
+            ran = migrate(conn, args.target)
+            print(f"applied: {ran or 'nothing, schema is current'}")
+        elif args.command == "status":
+            done = applied_versions(conn)
+            for m in MIGRATIONS:
+                print(f"{m.version:4d} {'applied' if m.version in done else 'pending':8s} {m.name}")
+        else:
+            results = check_queries(conn, args.analyze)
+            flagged = unjudged = 0
+            for r in results:
+                if r["flagged"]:
+                    flagged += 1
+                    status = f"SEQ SCAN on {', '.join(r['seq_scans'])}"
+                elif r["seq_scans"]:
+                    status = f"seq scan ok ({r['seq_ok']})"
+                elif r["small"]:
+                    unjudged += 1
+                    status = f"NOT JUDGED: seq scan on small {', '.join(r['small'])}"
+                else:
+                    status = "index"
+                timing = f" {r['ms']:.1f} ms" if r["ms"] is not None else ""
+                print(f"{r['name']:32s} cost={r['cost']:>12.1f}{timing}  {status}")
+            print(f"{flagged} of {len(results)} queries flagged")
+            if unjudged:
+                # on a fresh or small database this is most of them
+                print(f"{unjudged} of {len(results)} queries not judged: they scan relations "
+                      f"under {_SEQ_MIN_PAGES} pages; run the check on a populated, ANALYZEd database")
+            if args.strict and flagged:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
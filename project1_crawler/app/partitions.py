@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Monthly range partitioning of posts_4chan / posts_bsky by created_at,
+optionally sub-partitioned by board_name (posts_4chan).
+
+    python partitions.py convert posts_4chan --by-board   # one-off, see below
+    python partitions.py convert posts_bsky
+    python partitions.py list posts_4chan
+    python partitions.py retire posts_4chan --before 2025-09-01 [--drop]
+
+convert turns the plain table into a partitioned one with the same name,
+columns, id sequence, unique constraint and indexes, and moves every row
+into its monthly partition. It holds an exclusive lock while it copies, so
+stop the workers (or run them with SPOOL_ENABLED=1) first. On an empty
+table it takes a moment, so fresh installs can run it right after
+migrations.py.
+
+After that, nothing else changes: db.insert_*_posts call ensure_partitions()
+before each batch, which creates any month (and board) partition the rows
+need, and queries on the parent are pruned to the partitions their
+created_at / board_name filters touch. retire detaches (and optionally
+drops) whole months, which is a catalog operation instead of a DELETE.
+"""
+import argparse
+import json
+import re
+import threading
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from logutil import get_logger
+
+logger = get_logger("partitions")
+
+_IDENT_RE = re.compile(r"^[a-z0-9_]+$")
+
+# per process: table -> layout (None = not partitioned), and partitions known to exist
+_LAYOUT: Dict[str, Optional[Dict[str, Any]]] = {}
+_KNOWN: Dict[str, Set[Tuple[date, Optional[str]]]] = {}
+_LOCK = threading.Lock()
+
+
+def _ident(name: str) -> str:
+    # partition names are built from board names; keep them plain identifiers
+    if not _IDENT_RE.match(name or ""):
+        raise RuntimeError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def _month(v) -> date:
+    if isinstance(v, str):
+        v = datetime.fromisoformat(v.replace("Z", "+00:00"))
+    if v.tzinfo is not None:
+        v = v.astimezone(timezone.utc)
+    return date(v.year, v.month, 1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date, board: Optional[str] = None) -> str:
+    name = f"{table}_y{month.year}m{month.month:02d}"
+    return _ident(f"{name}_{board}" if board else name)
+
+
+def layout(conn, table: str) -> Optional[Dict[str, Any]]:
+    """
+    {"interval": "month", "sub": "board_name" | None} for a table converted
+    by this module (kept in the table comment), None for a plain table.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT obj_description(c.oid, 'pg_class')
+        FROM pg_class c JOIN pg_partitioned_table p ON p.partrelid = c.oid
+        WHERE c.oid = to_regclass(%s)
+        """,
+        (table,),
+    )
+    row = cur.fetchone()
+    cur.close()
+    if row is None:
+        return None
+    try:
+        return json.loads(row[0] or "{}").get("partitioning") or {"interval": "month", "sub": None}
+    except ValueError:
+        return {"interval": "month", "sub": None}
+
+
+def create_partition(cur, table: str, month: date, sub: Optional[str] = None,
+                     board: Optional[str] = None) -> None:
+    """Create the month partition (and the board partition under it) if missing."""
+    parent = partition_name(table, month)
+    lo = f"{month.isoformat()} 00:00:00+00"
+    hi = f"{_next_month(month).isoformat()} 00:00:00+00"
+    # two workers reaching a new month at once: the second waits, then no-ops
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (parent,))
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS {parent} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{lo}') TO ('{hi}')" + (f" PARTITION BY LIST ({sub})" if sub else "")
+    )
+    if sub and board is not None:
+        child = partition_name(table, month, board)
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {child} PARTITION OF {parent} FOR VALUES IN (%s)",
+            (board,),
+        )
+
+
+def ensure_partitions(conn, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Make sure every partition the rows fall into exists; no-op for a plain
+    table. DDL is committed before returning, so conn must have no open
+    work. Returns partitions created (or found) by this call.
+    """
+    with _LOCK:
+        if table not in _LAYOUT:
+            _LAYOUT[table] = layout(conn, table)
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.commit()
+        lay = _LAYOUT[table]
+        known = _KNOWN.setdefault(table, set())
+    if lay is None:
+        return 0
+
+    sub = lay.get("sub")
+    needed = set()
+    for r in rows:
+        if r.get("created_at") is None:
+            continue
+        needed.add((_month(r["created_at"]), r.get(sub) if sub else None))
+    missing = needed - known
+    if not missing:
+        return 0
+
+    cur = conn.cursor()
+    try:
+        for month, board in sorted(missing, key=lambda k: (k[0], k[1] or "")):
+            create_partition(cur, table, month, sub, board)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    with _LOCK:
+        known.update(missing)
+    return len(missing)
+
+
+def forget(table: Optional[str] = None) -> None:
+    """Drop cached layout/partitions (after retire, or a 'no partition' error)."""
+    with _LOCK:
+        for t in ([table] if table else list(_LAYOUT)):
+            _LAYOUT.pop(t, None)
+            _KNOWN.pop(t, None)
+
+
+def list_partitions(conn, table: str) -> List[Tuple[str, str, int]]:
+    """(partition, bound, approx rows) for every leaf and mid-level partition."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+        FROM pg_partition_tree(to_regclass(%s)) t
+        JOIN pg_class c ON c.oid = t.relid
+        WHERE t.level > 0
+        ORDER BY c.relname
+        """,
+        (table,),
+    )
+    out = cur.fetchall()
+    conn.commit()
+    cur.close()
+    return out
+
+
+def convert(conn, table: str, by_board: bool = False, keep_legacy: bool = False) -> int:
+    """
+    Replace plain `table` with a partitioned table of the same shape and
+    move its rows across. Returns rows moved.
+    """
+    _ident(table)
+    if layout(conn, table) is not None:
+        raise RuntimeError(f"{table} is already partitioned")
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_inherits WHERE inhparent = to_regclass(%s) LIMIT 1", (table,))
+    if cur.fetchone():
+        # e.g. a TimescaleDB hypertable: it is already chunked by time
+        raise RuntimeError(f"{table} already has child tables; not converting")
+    if by_board and table != "posts_4chan":
+        raise RuntimeError("--by-board only applies to posts_4chan")
+
+    legacy = f"{table}_legacy"
+    cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    # a NULL key has no month partition to go to; refuse before anything moves
+    cur.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE created_at IS NULL"
+        + (" OR board_name IS NULL" if by_board else "")
+    )
+    nulls = cur.fetchone()[0]
+    if nulls:
+        conn.rollback()
+        raise RuntimeError(
+            f"{table}: {nulls} rows have a NULL created_at"
+            + (" or board_name" if by_board else "")
+            + "; fix or delete them before converting"
+        )
+    cur.execute(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), con.conname IS NOT NULL
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.contype IN ('u', 'p')
+        WHERE i.indrelid = to_regclass(%s)
+        """,
+        (table,),
+    )
+    indexes = cur.fetchall()
+    cur.execute(
+        """
+        SELECT pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('u', 'p')
+        """,
+        (table,),
+    )
+    uniques = [r[0] for r in cur.fetchall()]
+
+    # the old table and its indexes step aside under *_legacy names
+    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    for name, _, is_constraint in indexes:
+        if not is_constraint:
+            cur.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+
+    sub = "board_name" if by_board else None
+    cur.execute(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE (created_at)"
+    )
+    # the id sequence now belongs to the new table, so dropping legacy keeps it
+    cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (legacy,))
+    seq = cur.fetchone()
+    if seq and seq[0]:
+        cur.execute(f"ALTER SEQUENCE {seq[0]} OWNED BY {table}.id")
+    for u in uniques:
+        cur.execute(f"ALTER TABLE {table} ADD {u}")
+    for name, indexdef, is_constraint in indexes:
+        if is_constraint:
+            continue
+        # pg_get_indexdef was read before the rename, so it names the new table
+        cur.execute(indexdef.replace(" INDEX ", " INDEX IF NOT EXISTS ", 1))
+    cur.execute(
+        f"COMMENT ON TABLE {table} IS %s",
+        (json.dumps({"partitioning": {"interval": "month", "sub": sub}}),),
+    )
+
+    cur.execute(
+        f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date"
+        + (", board_name" if sub else ", NULL") + f" FROM {legacy}"
+    )
+    for month, board in cur.fetchall():
+        create_partition(cur, table, month, sub, board)
+    cur.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    moved = cur.rowcount
+    if not keep_legacy:
+        cur.execute(f"DROP TABLE {legacy}")
+    conn.commit()
+    # fresh partitions have no statistics until autovacuum gets to them
+    cur.execute(f"ANALYZE {table}")
+    conn.commit()
+    cur.close()
+    forget(table)
+    logger.info(f"converted {table}: rows={moved} by_board={by_board} legacy_kept={keep_legacy}")
+    return moved
+
+
+def retire(conn, table: str, before: date, drop: bool = False) -> List[str]:
+    """
+    Detach every month partition that ends on or before `before` (and drop
+    it if asked). Detached tables keep their data for archiving.
+    """
+    done = []
+    cur = conn.cursor()
+    for name, bound, _ in list_partitions(conn, table):
+        m = re.fullmatch(rf"{table}_y(\d{{4}})m(\d{{2}})", name)
+        if not m:
+            continue
+        month = date(int(m.group(1)), int(m.group(2)), 1)
+        if _next_month(month) > before:
+            continue
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if drop:
+            cur.execute(f"DROP TABLE {name}")
+        conn.commit()
+        done.append(name)
+        logger.info(f"{'dropped' if drop else 'detached'} {name} ({bound})")
+    cur.close()
+    forget(table)
+    return done
+
+
+def main():
+    from config import DATABASE_URL
+    from db import get_conn
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=("convert", "list", "retire"))
+    ap.add_argument("table", choices=("posts_4chan", "posts_bsky"))
+    ap.add_argument("--by-board", action="store_true", help="convert: sub-partition posts_4chan by board_name")
+    ap.add_argument("--keep-legacy", action="store_true", help="convert: keep the old table as <table>_legacy")
+    ap.add_argument("--before", type=date.fromisoformat, help="retire: months ending on or before this date")
+    ap.add_argument("--drop", action="store_true", help="retire: drop instead of only detaching")
+    args = ap.parse_args()
+
+    conn = get_conn(DATABASE_URL)
+    try:
+        if args.command == "convert":
+            print(f"moved {convert(conn, args.table, args.by_board, args.keep_legacy)} rows")
+        elif args.command == "list":
+            for name, bound, rows in list_partitions(conn, args.table):
+                print(f"{name:36s} {rows:>12d}  {bound}")
+        else:
+            if args.before is None:
+                ap.error("retire needs --before")
+            print(retire(conn, args.table, args.before, args.drop))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
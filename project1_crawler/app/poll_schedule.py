@@ -0,0 +1,102 @@
+import json
+import time
+from typing import Optional
+
+from state import StateStore
+
+# per-source yield, written by the worker after each job and read by the producer
+NS = "source_rate"
+# one entry per source with a job queued or running (see claim_source)
+NS_INFLIGHT = "source_inflight"
+# written by the producer on every loop: which host it runs on, and when
+NS_PRODUCER = "producer"
+
+
+def source_key(kind: str, name: str) -> str:
+    """kind is 'chan' or 'bsky', e.g. source_key('chan', 'sp') -> 'chan:sp'."""
+    return f"{kind}:{name}"
+
+
+def record_yield(store: StateStore, source: str, new_posts: int, alpha: float,
+                 now: Optional[float] = None) -> Optional[float]:
+    """
+    Fold one job's new-post count into the source's EWMA rate (posts/sec).
+    The first job for a source only sets the clock, since there is no
+    interval to divide by yet. Returns the updated rate.
+    """
+    now = time.time() if now is None else now
+    raw = store.get(NS, source)
+    prev = json.loads(raw) if raw else None
+    if prev is None:
+        rec = {"rate": None, "last": now}
+    else:
+        elapsed = max(now - float(prev["last"]), 1.0)
+        observed = new_posts / elapsed
+        rate = prev.get("rate")
+        rate = observed if rate is None else alpha * observed + (1.0 - alpha) * rate
+        rec = {"rate": rate, "last": now}
+    # a concurrent job for the same source already recorded; drop ours
+    store.compare_and_set(NS, source, raw, json.dumps(rec))
+    return rec["rate"]
+
+
+def read_rate(store: StateStore, source: str) -> Optional[float]:
+    raw = store.get(NS, source)
+    return json.loads(raw).get("rate") if raw else None
+
+
+def poll_interval(rate: Optional[float], min_s: float, max_s: float, target_posts: float) -> float:
+    """
+    Seconds until the next poll: long enough to expect ~target_posts new
+    posts, clamped to [min_s, max_s]. Unknown rate polls at min_s.
+    """
+    if rate is None:
+        return min_s
+    if rate <= 0:
+        return max_s
+    return max(min_s, min(max_s, target_posts / rate))
+
+
+def claim_source(store: StateStore, source: str, ttl: float, now: Optional[float] = None) -> bool:
+    """
+    Mark source as having a job queued/running. False if an unexpired claim
+    exists, i.e. the producer should not queue another one. Claims older
+    than ttl are taken over (the worker that held it likely died).
+    """
+    now = time.time() if now is None else now
+    raw = store.get(NS_INFLIGHT, source)
+    if raw is not None and now - float(raw) < ttl:
+        return False
+    return store.compare_and_set(NS_INFLIGHT, source, raw, str(now))
+
+
+def release_source(store: StateStore, source: str) -> None:
+    """Called by the worker when the source's job finishes (ok or not)."""
+    store.delete(NS_INFLIGHT, source)
+
+
+def mark_producer(store: StateStore, host: str, now: Optional[float] = None) -> None:
+    """Record that a producer on host uses this store (see claim_store_problem)."""
+    now = time.time() if now is None else now
+    store.put_many(NS_PRODUCER, {"host": json.dumps(host), "seen_at": json.dumps(now)})
+
+
+def claim_store_problem(store: StateStore, host: str, max_age: float,
+                        now: Optional[float] = None) -> Optional[str]:
+    """
+    Claims live in the local SQLite state file, so they only stop duplicate
+    jobs when the producer and every worker open the same file on one host.
+    Called by a worker: returns why this store looks unshared, or None.
+    """
+    now = time.time() if now is None else now
+    raw_host = store.get(NS_PRODUCER, "host")
+    raw_seen = store.get(NS_PRODUCER, "seen_at")
+    if raw_host is None or raw_seen is None:
+        return f"no producer has written to {store.path}"
+    producer_host = json.loads(raw_host)
+    if producer_host != host:
+        return f"{store.path} was last written by a producer on {producer_host}, this worker runs on {host}"
+    age = now - float(json.loads(raw_seen))
+    if age > max_age:
+        return f"the producer last wrote to {store.path} {age:.0f}s ago"
+    return None
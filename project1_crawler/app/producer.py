@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
+import json
 import os
+import socket
 import time
 from faktory import Client
 
@@ -9,17 +11,228 @@ try:
         CHAN_BOARDS as CFG_CHAN_BOARDS,
         BSKY_ACTORS as CFG_BSKY_ACTORS,
         PRODUCER_SLEEP_SECONDS as CFG_SLEEP,
+        BSKY_BATCH_SIZE as CFG_BSKY_BATCH_SIZE,
+        PRODUCER_ADAPTIVE as CFG_ADAPTIVE,
+        PRODUCER_TICK_SECONDS as CFG_TICK,
+        POLL_MIN_SECONDS,
+        POLL_MAX_SECONDS,
+        POLL_TARGET_POSTS,
+        STATE_DB_PATH,
+        JOB_CLAIM_TTL_SECONDS,
+        PRODUCER_MAX_QUEUE_DEPTH,
+        PRODUCER_BACKOFF_SECONDS,
+        BSKY_INGEST_MODE,
+        BSKY_STREAM_STALE_SECONDS,
+        CHAN_QUEUE,
+        BSKY_QUEUE,
     )
 except Exception:
     CFG_CHAN_BOARDS = "sp,pol"
     CFG_BSKY_ACTORS = ""
     CFG_SLEEP = 60
+    CFG_BSKY_BATCH_SIZE = 0
+    # adaptive polling needs the worker's state store
+    CFG_ADAPTIVE = False
+    CFG_TICK = 5.0
+    POLL_MIN_SECONDS = POLL_MAX_SECONDS = POLL_TARGET_POSTS = 0.0
+    STATE_DB_PATH = None
+    JOB_CLAIM_TTL_SECONDS = 900.0
+    PRODUCER_MAX_QUEUE_DEPTH = 200
+    PRODUCER_BACKOFF_SECONDS = 30.0
+    BSKY_INGEST_MODE = "poll"
+    BSKY_STREAM_STALE_SECONDS = 120.0
+    CHAN_QUEUE = "chan"
+    BSKY_QUEUE = "bsky"
 
+# one queue per source type (runner.py runs a worker pool for each)
+QUEUE_FOR = {"chan": CHAN_QUEUE, "bsky": BSKY_QUEUE}
+CRAWL_QUEUES = [CHAN_QUEUE, BSKY_QUEUE]
 
-def _split_csv(val: str):
+# exposed via the log line and the state store ("producer" namespace)
+STATS = {
+    "queue_depth": None,
+    "queue_depths": None,
+    "enqueued": 0,
+    "skipped_pending": 0,
+    "skipped_backpressure": 0,
+}
+
+
+def _split_csv(val):
+    # config.BSKY_ACTORS is already a list
+    if isinstance(val, (list, tuple)):
+        return [x.strip() for x in val if x.strip()]
     return [x.strip() for x in val.split(",") if x.strip()]
 
 
+# faktory releases whose connection object we know how to send INFO on;
+# the Python client has no public call for it
+_INFO_CLIENT_VERSIONS = ("1.0.",)
+_INFO_WARNED = False
+
+
+def _info_supported(client):
+    global _INFO_WARNED
+    import faktory
+    version = getattr(faktory, "__version__", "")
+    conn = getattr(client, "faktory", None)
+    ok = (version.startswith(_INFO_CLIENT_VERSIONS)
+          and callable(getattr(conn, "reply", None))
+          and callable(getattr(conn, "get_message", None)))
+    if not ok and not _INFO_WARNED:
+        _INFO_WARNED = True
+        print(f"PRODUCER: cannot read queue depths with faktory {version or '?'}; "
+              "queue backpressure is off", flush=True)
+    return ok
+
+
+def queue_depths(client):
+    """
+    Jobs waiting in each of CRAWL_QUEUES according to Faktory INFO. None if
+    unknown (INFO failed, or a faktory client version we have not checked),
+    in which case no queue counts as backlogged.
+    """
+    if not _info_supported(client):
+        return None
+    try:
+        client.faktory.reply("INFO")
+        info = json.loads(next(client.faktory.get_message()))
+        queues = info.get("faktory", {}).get("queues", {})
+        return {q: int(queues.get(q, 0)) for q in CRAWL_QUEUES}
+    except Exception:
+        return None
+
+
+def _backlogged(client, counts):
+    """
+    Source kinds ("chan", "bsky") whose queue holds more than
+    PRODUCER_MAX_QUEUE_DEPTH jobs. counts = sources due per kind; those of a
+    backlogged kind are counted as skipped. A slow Bluesky queue no longer
+    stops 4chan jobs from being queued, and the other way round.
+    """
+    depths = queue_depths(client)
+    STATS["queue_depth"] = None if depths is None else sum(depths.values())
+    STATS["queue_depths"] = depths
+    if depths is None:
+        return set()
+    full = set(k for k, q in QUEUE_FOR.items() if depths.get(q, 0) > PRODUCER_MAX_QUEUE_DEPTH)
+    STATS["skipped_backpressure"] += sum(counts.get(k, 0) for k in full)
+    return full
+
+
+def _publish_stats(store):
+    print("PRODUCER: stats", STATS, flush=True)
+    if store is not None:
+        from poll_schedule import NS_PRODUCER, mark_producer
+        store.put_many(NS_PRODUCER, {k: json.dumps(v) for k, v in STATS.items()})
+        # lets workers notice when they do not share this store (and its claims)
+        mark_producer(store, socket.gethostname())
+
+
+def _stream_healthy(store):
+    """True when bsky_stream.py is covering Bluesky and has flushed recently."""
+    if store is None or os.getenv("BSKY_INGEST_MODE", BSKY_INGEST_MODE) != "stream":
+        return False
+    from bsky_stream import heartbeat_age
+    age = heartbeat_age(store)
+    return age is not None and age < BSKY_STREAM_STALE_SECONDS
+
+
+def _enqueue(client, boards, actors, bsky_batch, store=None):
+    """
+    Queue crawl jobs. With a state store, a source whose previous job is
+    still queued or running (its claim is held) is skipped, and Bluesky
+    polling pauses while the stream consumer is healthy.
+    """
+    if actors and _stream_healthy(store):
+        actors = []
+
+    if store is not None:
+        from poll_schedule import claim_source, release_source, source_key
+
+        def claimed(kind, name):
+            if claim_source(store, source_key(kind, name), JOB_CLAIM_TTL_SECONDS):
+                return True
+            STATS["skipped_pending"] += 1
+            return False
+
+        boards = [b for b in boards if claimed("chan", b)]
+        actors = [a for a in actors if claimed("bsky", a)]
+
+    jobs = [("crawl_board", [board], CHAN_QUEUE, [("chan", board)]) for board in boards]
+    if bsky_batch > 0:
+        for i in range(0, len(actors), bsky_batch):
+            batch = actors[i:i + bsky_batch]
+            jobs.append(("crawl_bsky_actors", [batch], BSKY_QUEUE, [("bsky", a) for a in batch]))
+    else:
+        jobs += [("crawl_bsky_actor", [actor], BSKY_QUEUE, [("bsky", actor)]) for actor in actors]
+
+    for n, (job, args, queue, _) in enumerate(jobs):
+        try:
+            client.queue(job, args=args, queue=queue)
+        except Exception:
+            # nothing will run for the sources not queued yet: free their
+            # claims now instead of leaving them idle for JOB_CLAIM_TTL_SECONDS
+            if store is not None:
+                for _, _, _, sources in jobs[n:]:
+                    for kind, name in sources:
+                        release_source(store, source_key(kind, name))
+            raise
+    STATS["enqueued"] += len(boards) + len(actors)
+    return boards, actors
+
+
+def run_adaptive(chan_boards, bsky_actors, bsky_batch, tick_seconds):
+    """
+    Poll each source on its own clock. The worker records every job's
+    new-post count as an EWMA rate (poll_schedule.record_yield); after enqueueing
+    a source we wait roughly POLL_TARGET_POSTS / rate before the next poll,
+    clamped to [POLL_MIN_SECONDS, POLL_MAX_SECONDS].
+    """
+    from state import get_state_store
+    from poll_schedule import source_key, read_rate, poll_interval
+
+    store = get_state_store(STATE_DB_PATH)
+    sources = [("chan", b) for b in chan_boards] + [("bsky", a) for a in bsky_actors]
+    next_due = {s: 0.0 for s in sources}
+
+    while True:
+        now = time.time()
+        due = [s for s in sources if next_due[s] <= now]
+        if due:
+            with Client() as client:
+                full = _backlogged(client, {k: sum(1 for kind, _ in due if kind == k) for k in QUEUE_FOR})
+                # workers of a backlogged queue are behind: try its sources again later
+                for s in due:
+                    if s[0] in full:
+                        next_due[s] = now + PRODUCER_BACKOFF_SECONDS
+                due = [s for s in due if s[0] not in full]
+                if not due:
+                    _publish_stats(store)
+                    time.sleep(tick_seconds)
+                    continue
+                boards = [name for kind, name in due if kind == "chan"]
+                actors = [name for kind, name in due if kind == "bsky"]
+                boards, actors = _enqueue(client, boards, actors, bsky_batch, store)
+
+            queued = set(("chan", b) for b in boards) | set(("bsky", a) for a in actors)
+            intervals = {}
+            for kind, name in due:
+                if (kind, name) not in queued:
+                    # previous job still pending/running: look again soon
+                    next_due[(kind, name)] = now + POLL_MIN_SECONDS
+                    continue
+                rate = read_rate(store, source_key(kind, name))
+                wait = poll_interval(rate, POLL_MIN_SECONDS, POLL_MAX_SECONDS, POLL_TARGET_POSTS)
+                next_due[(kind, name)] = now + wait
+                intervals[name] = int(wait)
+            print("PRODUCER: enqueued boards=", boards, "actors=", len(actors),
+                  "next_in=", intervals, flush=True)
+            _publish_stats(store)
+
+        time.sleep(tick_seconds)
+
+
 def main():
     # boards
     env_boards = os.getenv("CHAN_BOARDS")
@@ -36,16 +249,32 @@ def main():
         bsky_actors = _split_csv(CFG_BSKY_ACTORS)
 
     sleep_seconds = int(os.getenv("PRODUCER_SLEEP_SECONDS", str(CFG_SLEEP)))
+    # >0: hand actors to workers in crawl_bsky_actors batches of this size
+    bsky_batch = int(os.getenv("BSKY_BATCH_SIZE", str(CFG_BSKY_BATCH_SIZE)))
+
+    # opt-in: without it every source is queued every sleep_seconds
+    adaptive = os.getenv("PRODUCER_ADAPTIVE", "1" if CFG_ADAPTIVE else "0") == "1"
+    if adaptive and STATE_DB_PATH is not None:
+        tick = float(os.getenv("PRODUCER_TICK_SECONDS", str(CFG_TICK)))
+        print("PRODUCER: adaptive boards=", chan_boards, "actors=", bsky_actors, "tick=", tick, flush=True)
+        run_adaptive(chan_boards, bsky_actors, bsky_batch, tick)
+        return
+
+    store = None
+    if STATE_DB_PATH is not None:
+        from state import get_state_store
+        store = get_state_store(STATE_DB_PATH)
 
     while True:
         print("PRODUCER: boards=", chan_boards, "actors=", bsky_actors, "sleep=", sleep_seconds, flush=True)
         # THIS is the faktory client your worker is using too
         with Client() as client:
-            for board in chan_boards:
-                client.queue("crawl_board", args=[board])
-
-            for actor in bsky_actors:
-                client.queue("crawl_bsky_actor", args=[actor])
+            full = _backlogged(client, {"chan": len(chan_boards), "bsky": len(bsky_actors)})
+            _enqueue(client,
+                     [] if "chan" in full else chan_boards,
+                     [] if "bsky" in full else bsky_actors,
+                     bsky_batch, store)
+        _publish_stats(store)
 
         time.sleep(sleep_seconds)
 
@@ -0,0 +1,128 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread in the process.
+    rate = requests per second (<= 0 disables limiting), burst = bucket size.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def scale(self, share: float) -> None:
+        """Keep `share` of the configured rate (processes splitting one budget)."""
+        with self._lock:
+            self.rate *= share
+
+    def acquire(self) -> float:
+        """Block until a token is free. Returns the seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _header_float(headers, name: str):
+    if not headers:
+        return None
+    value = None
+    try:
+        value = headers.get(name)
+    except Exception:
+        pass
+    if value is None:
+        try:
+            for k, v in headers.items():
+                if k.lower() == name:
+                    value = v
+                    break
+        except Exception:
+            return None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    RateLimiter that follows the server's RateLimit-Remaining / RateLimit-Reset
+    headers and, after a 429, pauses every caller until the reset time.
+    The rate is halved on each 429 and creeps back up on successful calls
+    (never above the configured rate).
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, min_rate: float = 0.2):
+        super().__init__(rate, burst)
+        self.max_rate = self.rate
+        self.min_rate = min(min_rate, self.rate) if self.rate > 0 else 0.0
+        self._paused_until = 0.0
+        self.throttled = 0
+
+    def scale(self, share: float) -> None:
+        with self._lock:
+            self.rate *= share
+            self.max_rate *= share
+            self.min_rate = min(self.min_rate, self.max_rate)
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.time()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+            waited += pause
+        return waited + super().acquire()
+
+    def observe(self, headers) -> None:
+        """Feed the headers of any response (success or not)."""
+        if self.max_rate <= 0:
+            return
+        remaining = _header_float(headers, "ratelimit-remaining")
+        reset = _header_float(headers, "ratelimit-reset")
+        with self._lock:
+            if remaining is None or reset is None:
+                # no hints: additive increase back toward the configured rate
+                self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+                return
+            window = max(reset - time.time(), 1.0)
+            # spread what is left of the server window over the time until reset
+            self.rate = max(self.min_rate, min(self.max_rate, remaining / window))
+            if remaining <= 0:
+                self._paused_until = max(self._paused_until, reset)
+
+    def on_throttled(self, headers, attempt: int) -> float:
+        """Record a 429 and pause everyone; returns the pause in seconds."""
+        now = time.time()
+        reset = _header_float(headers, "ratelimit-reset")
+        retry_after = _header_float(headers, "retry-after")
+        if reset is not None and reset > now:
+            until = reset
+        elif retry_after is not None:
+            until = now + retry_after
+        else:
+            until = now + min(60.0, 2.0 ** attempt)
+        with self._lock:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, until)
+            if self.max_rate > 0:
+                self.rate = max(self.min_rate, self.rate / 2)
+        return until - now
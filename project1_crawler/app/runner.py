@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Run the crawl workers as a pool of processes per Faktory queue:
+
+    chan queue    -> WORKER_CHAN_PROCESSES x WORKER_CHAN_CONCURRENCY jobs (crawl_board)
+    bsky queue    -> WORKER_BSKY_PROCESSES x WORKER_BSKY_CONCURRENCY jobs (crawl_bsky_*)
+    legacy queues -> WORKER_LEGACY_PROCESSES x WORKER_LEGACY_CONCURRENCY jobs (either)
+
+Each process is a worker.run() on its own queue, so a Bluesky 429 pause
+only holds up Bluesky jobs, and board crawls (JSON parsing, COPY encoding)
+spread over the host's cores. A source's request budget (CHAN_MAX_RPS,
+BSKY_MAX_RPS) is split evenly between its pool's processes, minus
+WORKER_LEGACY_SHARE for the legacy pool, which drains the pre-split queues
+(both job types) without taking either pool's slots. Each process serves
+/metrics on METRICS_PORT + its index.
+
+A process that dies is restarted. SIGTERM/SIGINT stops the pool: every
+process stops fetching jobs and gets WORKER_SHUTDOWN_SECONDS to finish and
+ACK the ones it is running before it is killed.
+"""
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+# the pool sizes come from the same env files worker.py loads
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
+if load_dotenv is not None:
+    for p in (Path("/etc/social-pipeline.env"),
+              Path("/home/irajmohan/social-pipeline/.env"),
+              Path(__file__).resolve().parent.parent / ".env"):
+        if p.exists():
+            load_dotenv(p, override=True)
+
+from config import (
+    CHAN_QUEUE,
+    BSKY_QUEUE,
+    WORKER_CHAN_PROCESSES,
+    WORKER_CHAN_CONCURRENCY,
+    WORKER_BSKY_PROCESSES,
+    WORKER_BSKY_CONCURRENCY,
+    WORKER_LEGACY_QUEUES,
+    WORKER_LEGACY_PROCESSES,
+    WORKER_LEGACY_CONCURRENCY,
+    WORKER_LEGACY_SHARE,
+    WORKER_SHUTDOWN_SECONDS,
+    METRICS_PORT,
+)
+from logutil import get_logger
+
+logger = get_logger("runner")
+
+# a process that exits sooner than this after starting is restarted with backoff
+_MIN_UPTIME_SECONDS = 30.0
+_MAX_RESTART_DELAY = 60.0
+
+
+class PoolSpec(NamedTuple):
+    name: str
+    queues: List[str]
+    processes: int
+    concurrency: int
+
+
+def pool_specs() -> List[PoolSpec]:
+    chan_procs = WORKER_CHAN_PROCESSES if WORKER_CHAN_PROCESSES > 0 else (os.cpu_count() or 1)
+    legacy = [q for q in WORKER_LEGACY_QUEUES if q not in (CHAN_QUEUE, BSKY_QUEUE)]
+    specs = [
+        PoolSpec("chan", [CHAN_QUEUE], chan_procs, max(WORKER_CHAN_CONCURRENCY, 1)),
+        PoolSpec("bsky", [BSKY_QUEUE], WORKER_BSKY_PROCESSES, max(WORKER_BSKY_CONCURRENCY, 1)),
+        # the pre-split queues mix crawl_board and crawl_bsky_* jobs
+        PoolSpec("legacy", legacy, WORKER_LEGACY_PROCESSES if legacy else 0,
+                 max(WORKER_LEGACY_CONCURRENCY, 1)),
+    ]
+    return [s for s in specs if s.processes > 0]
+
+
+def _child(spec: PoolSpec, metrics_port: int, chan_share: float, bsky_share: float) -> None:
+    # Ctrl-C reaches the whole process group; the runner turns it into one
+    # SIGTERM per child, which faktory's Worker handles as a graceful stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import worker
+    worker.run(spec.queues, spec.concurrency, metrics_port, chan_share, bsky_share)
+
+
+class _Slot:
+    """One process of a pool, restarted when it dies."""
+
+    def __init__(self, spec: PoolSpec, index: int, metrics_port: int,
+                 chan_share: float, bsky_share: float):
+        self.spec = spec
+        self.name = f"worker-{spec.name}-{index}"
+        self.args = (spec, metrics_port, chan_share, bsky_share)
+        self.proc: Optional[mp.Process] = None
+        self.started = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+
+    def start(self, ctx) -> None:
+        self.proc = ctx.Process(target=_child, args=self.args, name=self.name)
+        self.proc.start()
+        self.started = time.monotonic()
+        logger.info(f"started {self.name} pid={self.proc.pid} queues={self.spec.queues} "
+                    f"concurrency={self.spec.concurrency}")
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.is_alive()
+
+
+class Runner:
+    def __init__(self, specs: List[PoolSpec], shutdown_seconds: float = WORKER_SHUTDOWN_SECONDS,
+                 metrics_port: int = METRICS_PORT, legacy_share: float = WORKER_LEGACY_SHARE):
+        # spawn: children import worker (sessions, pools, sqlite) from scratch
+        self.ctx = mp.get_context("spawn")
+        self.shutdown_seconds = shutdown_seconds
+        self.stopping = threading.Event()
+        self.slots: List[_Slot] = []
+
+        n_chan = sum(s.processes for s in specs if s.name == "chan") or 1
+        n_bsky = sum(s.processes for s in specs if s.name == "bsky") or 1
+        n_legacy = sum(s.processes for s in specs if s.name == "legacy")
+        legacy_share = min(max(legacy_share, 0.0), 1.0) if n_legacy else 0.0
+        i = 0
+        for spec in specs:
+            for _ in range(spec.processes):
+                port = metrics_port + i if metrics_port > 0 else 0
+                # each process gets its pool's slice of the source's budget
+                if spec.name == "legacy":
+                    chan_share = bsky_share = legacy_share / n_legacy
+                else:
+                    chan_share = (1.0 - legacy_share) / n_chan
+                    bsky_share = (1.0 - legacy_share) / n_bsky
+                self.slots.append(_Slot(spec, i, port, chan_share, bsky_share))
+                i += 1
+
+    def _on_signal(self, signum, frame) -> None:
+        if not self.stopping.is_set():
+            logger.info(f"signal {signum}: stopping {len(self.slots)} worker processes")
+            self.stopping.set()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        for slot in self.slots:
+            slot.start(self.ctx)
+        while not self.stopping.wait(1.0):
+            self._supervise()
+        self.stop()
+
+    def _supervise(self) -> None:
+        now = time.monotonic()
+        for slot in self.slots:
+            if slot.alive():
+                continue
+            if slot.next_start == 0.0:
+                code = slot.proc.exitcode if slot.proc else None
+                # quick deaths back off exponentially; a long-lived process restarts at once
+                if now - slot.started < _MIN_UPTIME_SECONDS:
+                    slot.restarts += 1
+                else:
+                    slot.restarts = 0
+                delay = min(_MAX_RESTART_DELAY, 2 ** slot.restarts - 1)
+                slot.next_start = now + delay
+                logger.warning(f"{slot.name} exited code={code}; restarting in {delay:.0f}s")
+            if now >= slot.next_start:
+                slot.next_start = 0.0
+                slot.start(self.ctx)
+
+    def stop(self) -> None:
+        running = [s for s in self.slots if s.alive()]
+        for slot in running:
+            os.kill(slot.proc.pid, signal.SIGTERM)
+        # the children wait shutdown_seconds for their jobs, then fail them back to Faktory
+        deadline = time.monotonic() + self.shutdown_seconds + 10
+        for slot in running:
+            slot.proc.join(max(deadline - time.monotonic(), 0))
+        for slot in running:
+            if slot.alive():
+                logger.warning(f"{slot.name} did not stop in time; killing it")
+                slot.proc.kill()
+                slot.proc.join()
+        logger.info("all worker processes stopped")
+
+
+def main():
+    specs = pool_specs()
+    logger.info("pools: " + ", ".join(f"{s.name}={s.processes}x{s.concurrency} {s.queues}" for s in specs))
+    Runner(specs).run()
+
+
+if __name__ == "__main__":
+    main()
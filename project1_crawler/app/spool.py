@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Local write-ahead spool between the crawlers and Postgres.
+
+Crawl jobs append their rows to a segment file (JSON lines) and seal it when
+the job ends; the job never waits on the database. A flusher (thread in the
+worker, or `python spool.py` on its own) bulk-loads sealed segments with
+COPY and records its progress in a checkpoint, so a crash or a DB outage
+only delays rows, it does not lose them. Re-loading rows after a crash is
+harmless: inserts are ON CONFLICT DO NOTHING.
+
+Layout of SPOOL_DIR:
+    <ts>-<pid>-<n>.open   segment being written (fsync every SPOOL_FSYNC_BYTES)
+    <ts>-<pid>-<n>.seg    sealed segment, ready for the flusher
+    checkpoint.json       {segment name: byte offset already loaded}
+    flusher.lock          held by the one active flusher
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import (
+    DATABASE_URL,
+    SPOOL_DIR,
+    SPOOL_FSYNC_BYTES,
+    SPOOL_FLUSH_ROWS,
+    SPOOL_FLUSH_INTERVAL,
+)
+from jsonutil import dumps_json
+from logutil import get_logger
+from state import load_json, save_json
+
+logger = get_logger("spool")
+
+_SEQ = 0
+_SEQ_LOCK = threading.Lock()
+
+
+def _segment_name() -> str:
+    global _SEQ
+    with _SEQ_LOCK:
+        _SEQ += 1
+        return f"{time.time_ns():020d}-{os.getpid()}-{_SEQ:06d}"
+
+
+class Segment:
+    """One append-only segment; close() fsyncs and seals it for the flusher."""
+
+    def __init__(self, spool_dir: Path = SPOOL_DIR, fsync_bytes: int = SPOOL_FSYNC_BYTES):
+        self.dir = Path(spool_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.name = _segment_name()
+        self.path = self.dir / f"{self.name}.open"
+        self.fsync_bytes = fsync_bytes
+        self.rows = 0
+        self._unsynced = 0
+        self._f = open(self.path, "ab")
+        self._lock = threading.Lock()
+
+    def append(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        buf = b"".join(
+            dumps_json({"t": table, "r": r}).encode("utf-8") + b"\n" for r in rows
+        )
+        with self._lock:
+            self._f.write(buf)
+            self.rows += len(rows)
+            self._unsynced += len(buf)
+            # group commits: one fsync per SPOOL_FSYNC_BYTES, not per append
+            if self._unsynced >= self.fsync_bytes:
+                self._sync()
+        return len(rows)
+
+    def _sync(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is None:
+                return
+            self._sync()
+            self._f.close()
+            self._f = None
+            if self.rows:
+                os.replace(self.path, self.path.with_suffix(".seg"))
+            else:
+                os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_segment() -> Segment:
+    return Segment()
+
+
+def write_rows(table: str, rows: List[Dict[str, Any]]) -> int:
+    """Append rows as one sealed segment. Returns rows spooled."""
+    if not rows:
+        return 0
+    with open_segment() as seg:
+        return seg.append(table, rows)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Flusher:
+    """Loads sealed segments into Postgres in large COPY batches."""
+
+    def __init__(self, spool_dir: Path = SPOOL_DIR, batch_rows: int = SPOOL_FLUSH_ROWS,
+                 url: str = DATABASE_URL):
+        self.dir = Path(spool_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.batch_rows = batch_rows
+        self.url = url
+        self.checkpoint_path = self.dir / "checkpoint.json"
+        self.stats = {"rows": 0, "inserted": 0, "segments": 0, "batches": 0}
+        self._lock_file = None
+
+    def acquire(self) -> bool:
+        """Only one flusher per spool dir; False if another one holds the lock."""
+        if self._lock_file is not None:
+            return True
+        f = open(self.dir / "flusher.lock", "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def _recover_orphans(self) -> None:
+        # an .open segment whose writer died is sealed as-is
+        for p in self.dir.glob("*.open"):
+            try:
+                pid = int(p.stem.split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            if not _pid_alive(pid):
+                logger.warning(f"sealing orphaned segment {p.name}")
+                os.replace(p, p.with_suffix(".seg"))
+
+    def pending_segments(self) -> List[Path]:
+        return sorted(self.dir.glob("*.seg"))
+
+    def _read(self, path: Path, offset: int, limit: int):
+        rows = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while len(rows) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # torn tail of a segment whose writer crashed mid-write
+                    logger.warning(f"skipping bad line in {path.name} at {offset}")
+                offset = f.tell()
+            eof = not f.readline()
+        return rows, offset, eof
+
+    def flush_once(self) -> int:
+        """Load up to batch_rows rows. Returns rows loaded (0 = spool empty)."""
+        from db import get_pool, insert_4chan_posts, insert_bsky_posts
+
+        self._recover_orphans()
+        checkpoint: Dict[str, int] = load_json(self.checkpoint_path)
+        by_table: Dict[str, List[Dict[str, Any]]] = {}
+        advanced: Dict[str, int] = {}
+        finished: List[Path] = []
+        total = 0
+
+        for seg in self.pending_segments():
+            if total >= self.batch_rows:
+                break
+            offset = int(checkpoint.get(seg.name, 0))
+            recs, new_offset, eof = self._read(seg, offset, self.batch_rows - total)
+            for rec in recs:
+                by_table.setdefault(rec["t"], []).append(rec["r"])
+            total += len(recs)
+            advanced[seg.name] = new_offset
+            if eof:
+                finished.append(seg)
+
+        if not advanced:
+            return 0
+
+        inserted = 0
+        with get_pool(self.url).connection() as conn:
+            if by_table.get("posts_4chan"):
+                inserted += insert_4chan_posts(conn, by_table["posts_4chan"], copy=True)
+            if by_table.get("posts_bsky"):
+                inserted += insert_bsky_posts(conn, by_table["posts_bsky"], copy=True)
+
+        # rows are committed; now move the checkpoint and drop finished segments
+        checkpoint.update(advanced)
+        for seg in finished:
+            checkpoint.pop(seg.name, None)
+        save_json(self.checkpoint_path, checkpoint)
+        for seg in finished:
+            seg.unlink()
+
+        self.stats["rows"] += total
+        self.stats["inserted"] += inserted
+        self.stats["segments"] += len(finished)
+        self.stats["batches"] += 1
+        logger.info(f"loaded rows={total} inserted={inserted} segments_done={len(finished)} "
+                    f"backlog={len(self.pending_segments())}")
+        return total
+
+    def run(self, interval: float = SPOOL_FLUSH_INTERVAL, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if not self.acquire():
+                stop.wait(interval)
+                continue
+            try:
+                # drain while there is work, then nap
+                while not stop.is_set() and self.flush_once() >= self.batch_rows:
+                    pass
+            except Exception as e:
+                # DB down or slow: rows stay on disk, retry later
+                logger.warning(f"flush failed, will retry: {e}")
+            stop.wait(interval)
+
+
+def start_flusher_thread() -> threading.Thread:
+    t = threading.Thread(target=Flusher().run, name="spool-flusher", daemon=True)
+    t.start()
+    return t
+
+
+if __name__ == "__main__":
+    Flusher().run()
@@ -1,6 +1,10 @@
 import json
+import os
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Optional
 
 def load_json(path: Path) -> Dict[str, Any]:
     if not path.exists():
@@ -16,3 +20,152 @@ def save_json(path: Path, data: Dict[str, Any]) -> None:
     with tmp.open('w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False)
     tmp.replace(path)
+
+
+class StateStore:
+    """
+    Crawl state in SQLite: (namespace, key) -> text value.
+
+    Every call reads or writes only the keys it names, so a job's state I/O
+    is O(keys touched). WAL mode + busy timeout let several worker
+    processes on the host share the file; compare_and_set/advance give
+    atomic updates instead of last-writer-wins.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                ns         TEXT NOT NULL,
+                key        TEXT NOT NULL,
+                value      TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (ns, key)
+            ) WITHOUT ROWID
+            """
+        )
+
+    def get(self, ns: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, ns: str, keys: Iterable[str]) -> Dict[str, str]:
+        keys = [str(k) for k in keys]
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM kv WHERE ns = ? AND key IN (SELECT value FROM json_each(?))",
+                (ns, json.dumps(keys)),
+            ).fetchall()
+        return {k: v for k, v in rows}
+
+    def items(self, ns: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._db.execute("SELECT key, value FROM kv WHERE ns = ?", (ns,)).fetchall()
+        return {k: v for k, v in rows}
+
+    def put(self, ns: str, key: str, value: str) -> None:
+        self.put_many(ns, {key: value})
+
+    def put_many(self, ns: str, items: Dict[str, str]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    """
+                    INSERT INTO kv (ns, key, value, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (ns, key) DO UPDATE
+                    SET value = excluded.value, updated_at = excluded.updated_at
+                    """,
+                    [(ns, str(k), v, now) for k, v in items.items()],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def compare_and_set(self, ns: str, key: str, expected: Optional[str], new: str) -> bool:
+        """Set key to new only if it still holds expected (None = absent). True on success."""
+        now = time.time()
+        with self._lock:
+            if expected is None:
+                cur = self._db.execute(
+                    "INSERT INTO kv (ns, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (ns, key) DO NOTHING",
+                    (ns, key, new, now),
+                )
+            else:
+                cur = self._db.execute(
+                    "UPDATE kv SET value = ?, updated_at = ? WHERE ns = ? AND key = ? AND value = ?",
+                    (new, now, ns, key, expected),
+                )
+            return cur.rowcount == 1
+
+    def advance(self, ns: str, key: str, value: int, expected: Optional[str] = None) -> int:
+        """
+        Raise an integer value monotonically (e.g. last seen post number).
+        Retries the compare-and-set if another worker moved it first;
+        returns the value now stored.
+        """
+        current = expected
+        while True:
+            if current is not None and int(current) >= value:
+                return int(current)
+            if self.compare_and_set(ns, key, current, str(value)):
+                return value
+            current = self.get(ns, key)
+
+    def delete(self, ns: str, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+    def prune(self, ns: str, keep: Iterable[str]) -> int:
+        """Delete every key in ns that is not in keep. Returns rows deleted."""
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM kv WHERE ns = ? AND key NOT IN (SELECT value FROM json_each(?))",
+                (ns, json.dumps([str(k) for k in keep])),
+            )
+            return cur.rowcount
+
+    def import_json_once(self, name: str, loader) -> bool:
+        """
+        Run loader(self) unless name was already imported; used to carry the
+        old JSON state files over. Returns True if it ran.
+        """
+        if self.get("_imports", name) is not None:
+            return False
+        loader(self)
+        self.put("_imports", name, str(time.time()))
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_STORE: Optional[StateStore] = None
+_STORE_PID: Optional[int] = None
+_STORE_LOCK = threading.Lock()
+
+def get_state_store(path: Path) -> StateStore:
+    """One StateStore per process (sqlite handles must not cross a fork)."""
+    global _STORE, _STORE_PID
+    with _STORE_LOCK:
+        if _STORE is None or _STORE_PID != os.getpid() or _STORE.path != Path(path):
+            _STORE = StateStore(path)
+            _STORE_PID = os.getpid()
+        return _STORE
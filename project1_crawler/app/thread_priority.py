@@ -0,0 +1,81 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def catalog_entries(catalog: List[Dict]) -> List[Dict]:
+    """
+    Flatten catalog.json into one dict per thread with its page position.
+    page is 1-based as served; n_pages is the catalog's page count.
+    """
+    entries = []
+    n_pages = len(catalog)
+    for page_idx, page in enumerate(catalog):
+        page_no = int(page.get("page", page_idx + 1) or page_idx + 1)
+        for t in page.get("threads", []):
+            if "no" not in t:
+                continue
+            entries.append({
+                "no": int(t["no"]),
+                "page": page_no,
+                "n_pages": n_pages,
+                "replies": int(t.get("replies", 0) or 0),
+                "time": int(t.get("time", 0) or 0),
+                "last_modified": int(t.get("last_modified", 0) or 0),
+            })
+    return entries
+
+
+def expected_new(entry: Dict, prev: Optional[Dict]) -> int:
+    """
+    Posts a fetch should return that we have not stored yet. The catalog's
+    reply count is exact, so for a thread we fetched before this is just
+    the growth since then; an unseen thread is new in full (OP + replies).
+    """
+    if prev is None:
+        return entry["replies"] + 1
+    return max(0, entry["replies"] - int(prev.get("replies", 0)))
+
+
+def velocity(entry: Dict, now: Optional[float] = None) -> float:
+    """Replies per hour over the thread's life so far."""
+    now = time.time() if now is None else now
+    age_h = max((now - entry["time"]) / 3600.0, 1.0 / 60) if entry["time"] else 1.0
+    return entry["replies"] / age_h
+
+
+def is_last_chance(entry: Dict, bottom_pages: int) -> bool:
+    """On one of the last bottom_pages catalog pages, i.e. next to be archived."""
+    return bottom_pages > 0 and entry["page"] > entry["n_pages"] - bottom_pages
+
+
+def prioritize(entries: List[Dict], old_meta: Dict[str, Dict], budget: int = 0,
+               page_weight: float = 1.0, bottom_pages: int = 1,
+               now: Optional[float] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Order the threads to fetch by expected new posts, most first, and cut
+    the list at budget fetches (0 = no cap). Returns (fetch, deferred).
+
+    Expected posts are weighted up toward the bottom of the catalog
+    (page_weight = extra weight on the last page), since a thread there
+    may be archived before the next poll; equal scores go to the faster
+    thread. Last-chance threads on the bottom pages are fetched even past
+    the budget. Deferred threads keep their old meta, so the next crawl
+    sees the same (or a larger) backlog for them.
+    """
+    scored = []
+    for e in entries:
+        exp = expected_new(e, old_meta.get(str(e["no"])))
+        span = max(e["n_pages"] - 1, 1)
+        urgency = (e["page"] - 1) / span
+        e = dict(e, expected=exp, last_chance=is_last_chance(e, bottom_pages))
+        scored.append((exp * (1.0 + page_weight * urgency), velocity(e, now), e))
+    scored.sort(key=lambda s: (s[0], s[1]), reverse=True)
+
+    ordered = [e for _, _, e in scored]
+    if budget <= 0 or len(ordered) <= budget:
+        return ordered, []
+    fetch = ordered[:budget]
+    deferred = []
+    for e in ordered[budget:]:
+        (fetch if e["last_chance"] and e["expected"] > 0 else deferred).append(e)
+    return fetch, deferred
@@ -21,6 +21,8 @@ if load_dotenv is not None:
             load_dotenv(p, override=True)
 
 # now import the real config (this will now see your NEW BSKY_ACTORS)
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List
 
@@ -28,21 +30,50 @@ from faktory import Worker
 from logutil import get_logger
 from config import (
     DATABASE_URL,
+    DB_BULK_COPY,
     FAKTORY_URL,
     CHAN_LAST_SEEN_PATH,
+    CHAN_THREAD_META_PATH,
     BSKY_CURSORS_PATH,
+    STATE_DB_PATH,
     BSKY_HANDLE,
     BSKY_APP_PASSWORD,
     BSKY_ACTORS,
     BSKY_HEAD_PAGES,
     BSKY_BACKFILL_PAGES,
     BSKY_MAX_BACKFILL_HOURS,
+    CHAN_MAX_INFLIGHT,
+    CHAN_FETCH_BUDGET,
+    CHAN_PAGE_WEIGHT,
+    CHAN_LAST_CHANCE_PAGES,
+    CHAN_SWEEP_DEPARTED,
+    CHAN_ARCHIVE_SWEEP,
+    CHAN_ARCHIVE_RECENT,
+    BSKY_MAX_INFLIGHT,
+    POLL_EWMA_ALPHA,
+    POLL_MAX_SECONDS,
+    JOB_CLAIM_TTL_SECONDS,
+    SPOOL_ENABLED,
+    SPOOL_FLUSHER_THREAD,
+    METRICS_PORT,
+    CHAN_QUEUE,
+    BSKY_QUEUE,
+    WORKER_LEGACY_QUEUES,
+    WORKER_SHUTDOWN_SECONDS,
 )
-from state import load_json, save_json
-from db import get_conn, insert_4chan_posts, insert_bsky_posts
-from chan_client import get_catalog, get_thread
+import json
+import socket
+from state import load_json, get_state_store, StateStore
+from poll_schedule import claim_store_problem, record_yield, release_source, source_key
+import spool
+import metrics
+from metrics import ROWS_STORED, STORE_SECONDS, track_job
+from db import get_pool, insert_4chan_posts, insert_bsky_posts
+from chan_client import get_catalog, get_thread, get_archive, connection_stats, LIMITER as CHAN_LIMITER
+from thread_priority import catalog_entries, prioritize
 from bsky_client_cached import get_bsky_client
-from bsky_client import get_author_feed, as_primitive
+from bsky_client import get_author_feed_limited, serialize_post, LIMITER as BSKY_LIMITER
+from bsky_stream import stream_floor
 
 try:
     from atproto_client.exceptions import RequestException
@@ -59,7 +90,7 @@ def safe_get_author_feed(client, actor, cursor):
     # tolerate vanished or invalid actors across atproto_client versions
     from atproto_client import exceptions as at_ex
     try:
-        return get_author_feed(client, actor, cursor)
+        return get_author_feed_limited(client, actor, cursor)
     except at_ex.BadRequestError as e:
         msg = str(e)
         # map common 4xx text variants to "profile-not-found"
@@ -78,70 +109,247 @@ def safe_get_author_feed(client, actor, cursor):
             return None, None
         raise
 
+def _import_json_state(store: StateStore) -> None:
+    # one-time carry-over from the old whole-file JSON state
+    for board, m in load_json(CHAN_LAST_SEEN_PATH).items():
+        store.put_many(f"chan_last_seen:{board}", {k: str(v) for k, v in m.items()})
+    for board, m in load_json(CHAN_THREAD_META_PATH).items():
+        store.put_many(f"chan_meta:{board}", {k: json.dumps(v) for k, v in m.items()})
+    store.put_many("bsky_cursor", {k: str(v) for k, v in load_json(BSKY_CURSORS_PATH).items() if v})
+
+def get_state() -> StateStore:
+    store = get_state_store(STATE_DB_PATH)
+    store.import_json_once("json-v1", _import_json_state)
+    return store
+
+def _thread_meta(t: Dict) -> Dict[str, int]:
+    # catalog.json / threads.json both carry these; if neither changed,
+    # the thread has no new posts for us
+    return {
+        "last_modified": int(t.get("last_modified", 0) or 0),
+        "replies": int(t.get("replies", 0) or 0),
+    }
+
+def _recently_archived(board: str, departed: List[int]) -> List[int]:
+    # departed threads that made it into archive.json; the rest were pruned
+    # or deleted and would only cost a 404
+    try:
+        recent = set(get_archive(board)[-CHAN_ARCHIVE_RECENT:])
+    except Exception as e:
+        logger.warning(f"4chan: archive.json failed board={board}: {e}; sweeping all departed threads")
+        return departed
+    return [no for no in departed if no in recent]
+
+_CLAIMS_CHECKED = False
+
+def _release(kind: str, name: str) -> None:
+    """Release the producer's claim on a source (poll_schedule.claim_source)."""
+    global _CLAIMS_CHECKED
+    store = get_state()
+    if not _CLAIMS_CHECKED:
+        # once per process, after a job has come in (so a producer has run)
+        _CLAIMS_CHECKED = True
+        problem = claim_store_problem(store, socket.gethostname(),
+                                      max(JOB_CLAIM_TTL_SECONDS, POLL_MAX_SECONDS))
+        if problem:
+            logger.warning(f"claims not shared with the producer: {problem}; it may queue "
+                           f"duplicate jobs (run producer and workers on one host with one STATE_DIR)")
+    release_source(store, source_key(kind, name))
+
 def crawl_board(board: str):
+    try:
+        with track_job("crawl_board"):
+            return _crawl_board(board)
+    finally:
+        # lets the producer queue this board again
+        _release("chan", board)
+
+def _crawl_board(board: str):
     logger.info(f"4chan: crawl board={board}")
+    t_start = time.monotonic()
 
-    last_seen_all = load_json(CHAN_LAST_SEEN_PATH)
-    board_map: Dict[str, int] = {k: int(v) for k, v in last_seen_all.get(board, {}).items()}
+    store = get_state()
+    ns_seen = f"chan_last_seen:{board}"
+    ns_meta = f"chan_meta:{board}"
 
     try:
         catalog = get_catalog(board)
     except Exception as e:
         logger.warning(f"4chan: catalog failed board={board}: {e}")
         catalog = []
-
-    active_threads: List[int] = []
-    for page in catalog:
-        for t in page.get("threads", []):
-            if "no" in t:
-                active_threads.append(int(t["no"]))
+    catalog_s = time.monotonic() - t_start
+
+    entries = catalog_entries(catalog)
+    active_threads: List[int] = [e["no"] for e in entries]
+    catalog_meta: Dict[str, Dict[str, int]] = {str(e["no"]): _thread_meta(e) for e in entries}
+
+    # the board's meta namespace only holds the previous catalog's threads
+    # (pruned below), so reading it whole is cheap and tells us which
+    # threads dropped off since then
+    old_meta: Dict[str, Dict[str, int]] = {
+        k: json.loads(v) for k, v in store.items(ns_meta).items()
+    }
+    departed: List[int] = []
+    if catalog and CHAN_SWEEP_DEPARTED:
+        departed = [int(k) for k in old_meta if k not in catalog_meta]
+        if departed and CHAN_ARCHIVE_SWEEP:
+            departed = _recently_archived(board, departed)
+    board_map: Dict[str, str] = store.get_many(
+        ns_seen, list(catalog_meta.keys()) + [str(no) for no in departed]
+    )
+    meta_updates: Dict[str, str] = {}
+
+    skipped = 0
+    candidates: List[Dict] = []
+    for e in entries:
+        key = str(e["no"])
+        prev = old_meta.get(key)
+        if prev is not None and prev == catalog_meta[key] and prev["last_modified"]:
+            skipped += 1
+        else:
+            candidates.append(e)
+    ordered, deferred = prioritize(candidates, old_meta, CHAN_FETCH_BUDGET,
+                                   CHAN_PAGE_WEIGHT, CHAN_LAST_CHANCE_PAGES)
+    # last-chance sweep first: a thread that left the catalog is archived
+    # (or already gone) and will not get another poll
+    to_fetch: List[int] = departed + [e["no"] for e in ordered]
+    sweep = set(departed)
+    swept_posts = 0
 
     inserted = 0
-    conn = get_conn(DATABASE_URL)
+    insert_s = 0.0
+    seen_updates: Dict[str, int] = {}
+    t_fetch = time.monotonic()
+    db_pool = get_pool(DATABASE_URL)
+    # spool mode: rows go to a local segment and the job never touches Postgres
+    seg = spool.open_segment() if SPOOL_ENABLED else None
+    conn = db_pool.getconn() if seg is None else None
     try:
-        for thread_no in active_threads:
-            last_seen = int(board_map.get(str(thread_no), 0))
-            try:
-                tjson = get_thread(board, thread_no)
-            except Exception:
-                continue
-
-            posts = tjson.get("posts", [])
-            new_posts = [p for p in posts if int(p.get("no", 0)) > last_seen]
-            if not new_posts:
-                continue
-
-            row_batch = []
-            for p in new_posts:
-                post_no = int(p.get("no", 0))
-                ts = int(p.get("time", 0))
-                created_at = datetime.fromtimestamp(ts, tz=timezone.utc)
-                has_media = any(k in p for k in ("filename", "ext", "tim"))
-
-                row_batch.append({
-                    "board_name": board,
-                    "thread_number": thread_no,
-                    "post_number": post_no,
-                    "created_at": created_at,
-                    "data": p,
-                    "has_media": has_media,
-                })
+        with ThreadPoolExecutor(max_workers=max(1, CHAN_MAX_INFLIGHT)) as pool:
+            futures = {}
+            for thread_no in to_fetch:
+                prev = old_meta.get(str(thread_no))
+                ims = prev.get("last_modified") if prev else None
+                futures[pool.submit(get_thread, board, thread_no, ims)] = thread_no
+
+            # fetches run in the pool; parsing and DB writes stay on this thread
+            for fut in as_completed(futures):
+                thread_no = futures[fut]
+                key = str(thread_no)
+                meta = catalog_meta.get(key)
+                try:
+                    tjson = fut.result()
+                except Exception:
+                    continue
 
-                board_map[str(thread_no)] = post_no
+                if tjson is None:
+                    # 304 Not Modified
+                    skipped += 1
+                    meta_updates[key] = json.dumps(meta)
+                    continue
 
-            inserted_now = insert_4chan_posts(conn, row_batch)
-            inserted += inserted_now
+                last_seen = int(board_map.get(key, 0))
+                posts = tjson.get("posts", [])
+                new_posts = [p for p in posts if int(p.get("no", 0)) > last_seen]
+                if not new_posts:
+                    meta_updates[key] = json.dumps(meta)
+                    continue
 
-        last_seen_all[board] = {k: str(v) for k, v in board_map.items()}
-        save_json(CHAN_LAST_SEEN_PATH, last_seen_all)
+                row_batch = []
+                for p in new_posts:
+                    post_no = int(p.get("no", 0))
+                    ts = int(p.get("time", 0))
+                    created_at = datetime.fromtimestamp(ts, tz=timezone.utc)
+                    has_media = any(k in p for k in ("filename", "ext", "tim"))
+
+                    row_batch.append({
+                        "board_name": board,
+                        "thread_number": thread_no,
+                        "post_number": post_no,
+                        "created_at": created_at,
+                        "data": p,
+                        "has_media": has_media,
+                    })
+
+                t_ins = time.monotonic()
+                if seg is not None:
+                    inserted += seg.append("posts_4chan", row_batch)
+                else:
+                    inserted += insert_4chan_posts(conn, row_batch, copy=DB_BULK_COPY)
+                batch_s = time.monotonic() - t_ins
+                insert_s += batch_s
+                STORE_SECONDS.observe(batch_s, source="chan", name=board)
+                if thread_no in sweep:
+                    swept_posts += len(row_batch)
+                seen_updates[key] = max(int(p.get("no", 0)) for p in new_posts)
+                meta_updates[key] = json.dumps(meta)
+
+        # state only moves once the rows are durable (committed or fsynced)
+        if seg is not None:
+            seg.close()
+        for key, post_no in seen_updates.items():
+            if key not in catalog_meta:
+                continue  # swept thread, pruned below
+            # compare-and-set, so a concurrent crawl of this board can't move it backwards
+            store.advance(ns_seen, key, post_no, expected=board_map.get(key))
+        store.put_many(ns_meta, {k: v for k, v in meta_updates.items() if k in catalog_meta})
+
+        # threads that left the catalog are dropped; a failed catalog
+        # leaves the stored state alone
+        if catalog:
+            store.prune(ns_seen, catalog_meta.keys())
+            store.prune(ns_meta, catalog_meta.keys())
     finally:
-        conn.close()
-
-    logger.info(f"4chan: board={board} inserted={inserted}")
-    return {"board": board, "inserted": inserted}
+        if seg is not None:
+            seg.close()
+        if conn is not None:
+            db_pool.putconn(conn)
+    if catalog:
+        record_yield(store, source_key("chan", board), inserted, POLL_EWMA_ALPHA)
+    ROWS_STORED.inc(inserted, source="chan", name=board)
+    fetch_s = time.monotonic() - t_fetch - insert_s
+    total_s = time.monotonic() - t_start
+    http = connection_stats()
+    dbp = db_pool.stats()
+
+    logger.info(
+        f"4chan: board={board} inserted={inserted} skipped={skipped} "
+        f"threads={len(active_threads)} fetched={len(to_fetch)} deferred={len(deferred)} "
+        f"swept={len(departed)} swept_posts={swept_posts} inflight={CHAN_MAX_INFLIGHT} "
+        f"catalog_s={catalog_s:.2f} fetch_s={fetch_s:.2f} insert_s={insert_s:.2f} total_s={total_s:.2f} "
+        f"http_requests={http['requests']} http_conns={http['connections']} http_reused={http['reused']} "
+        f"db_pool_size={dbp['size']} db_wait_total_s={dbp['wait_seconds_total']:.3f} db_wait_max_s={dbp['wait_seconds_max']:.3f}"
+    )
+    return {
+        "board": board,
+        "inserted": inserted,
+        "skipped": skipped,
+        "fetched": len(to_fetch),
+        "deferred": len(deferred),
+        "swept": len(departed),
+        "swept_posts": swept_posts,
+        "seconds": round(total_s, 3),
+    }
 
 # ---------- BLUESKY ----------
+def _parse_bsky_dt(raw):
+    if not raw:
+        return None
+    if isinstance(raw, str):
+        try:
+            return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except Exception:
+            return None
+    return raw
+
 def crawl_bsky_actor(actor: str):
+    try:
+        with track_job("crawl_bsky_actor"):
+            return _crawl_bsky_actor(actor)
+    finally:
+        _release("bsky", actor)
+
+def _crawl_bsky_actor(actor: str):
     if actor in DENY:
         logger.info("[bsky] denylist skip actor=%s", actor)
         return
@@ -150,18 +358,37 @@ def crawl_bsky_actor(actor: str):
         return
     logger.info(f"bsky: actor={actor}")
 
-    cursors: Dict[str, str] = load_json(BSKY_CURSORS_PATH)
-    cursor = cursors.get(actor)
+    store = get_state()
+    cursor = store.get("bsky_cursor", actor)
+
+    # newest post polled for this actor: {"indexed_at": ..., "uri": ...},
+    # plus stream_* fields from bsky_stream.py (event times, see stream_floor)
+    wm_raw = store.get("bsky_watermark", actor)
+    wm = json.loads(wm_raw) if wm_raw else {}
+    wm_dt = _parse_bsky_dt(wm.get("indexed_at"))
+    stop_dt, stop_uris = wm_dt, {wm.get("uri")}
+    floor = stream_floor(wm)
+    if floor is not None:
+        stop_dt, stop_uris = max(wm_dt, floor), {wm.get("uri"), wm.get("stream_uri")}
 
     client = get_bsky_client(BSKY_HANDLE, BSKY_APP_PASSWORD)
     rows = []
     inserted_total = 0
+    feed_latencies: List[float] = []
 
-    # HEAD crawl
+    def fetch_page(cur):
+        t0 = time.monotonic()
+        try:
+            return safe_get_author_feed(client, actor, cur)
+        finally:
+            feed_latencies.append(time.monotonic() - t0)
+
+    # HEAD crawl: newest first, stop at the watermark
     pages_fetched = 0
     next_cursor = None
-    while pages_fetched < BSKY_HEAD_PAGES:
-        feed, next_cursor = safe_get_author_feed(client, actor, None if pages_fetched == 0 else next_cursor)
+    reached_watermark = False
+    while pages_fetched < BSKY_HEAD_PAGES and not reached_watermark:
+        feed, next_cursor = fetch_page(None if pages_fetched == 0 else next_cursor)
         if feed is None:
             # invalid actor, stop trying pages for this actor
             break
@@ -176,7 +403,14 @@ def crawl_bsky_actor(actor: str):
 
             uri = getattr(post, "uri", None)
             dt = getattr(post, "indexed_at", None)
-            data = as_primitive(post)
+            if stop_dt is not None:
+                parsed = _parse_bsky_dt(dt)
+                # strictly older only: other posts indexed in the watermark's
+                # instant are kept, and ON CONFLICT drops any already stored
+                if uri in stop_uris or (parsed is not None and parsed < stop_dt):
+                    reached_watermark = True
+                    break
+            data = serialize_post(post)
 
             like_count = getattr(post, "like_count", None)
             repost_count = getattr(post, "repost_count", None)
@@ -195,13 +429,14 @@ def crawl_bsky_actor(actor: str):
 
         if not next_cursor:
             break
+    head_pages = pages_fetched
 
     # BACKFILL (optional)
     if BSKY_BACKFILL_PAGES > 0 and BSKY_MAX_BACKFILL_HOURS > 0:
         cutoff = datetime.now(timezone.utc) - timedelta(hours=BSKY_MAX_BACKFILL_HOURS)
         pages_fetched = 0
         while pages_fetched < BSKY_BACKFILL_PAGES:
-            feed, cursor = safe_get_author_feed(client, actor, cursor)
+            feed, cursor = fetch_page(cursor)
             pages_fetched += 1
 
             for item in feed:
@@ -212,23 +447,14 @@ def crawl_bsky_actor(actor: str):
                     continue
 
                 raw_dt = getattr(post, "indexed_at", None)
-                parsed_dt = None
-                if raw_dt:
-                    if isinstance(raw_dt, str):
-                        ts = raw_dt.replace("Z", "+00:00")
-                        try:
-                            parsed_dt = datetime.fromisoformat(ts)
-                        except Exception:
-                            parsed_dt = None
-                    else:
-                        parsed_dt = raw_dt
+                parsed_dt = _parse_bsky_dt(raw_dt)
 
                 if parsed_dt and parsed_dt < cutoff:
                     pages_fetched = BSKY_BACKFILL_PAGES
                     break
 
                 uri = getattr(post, "uri", None)
-                data = as_primitive(post)
+                data = serialize_post(post)
                 like_count = getattr(post, "like_count", None)
                 repost_count = getattr(post, "repost_count", None)
                 has_media = bool(getattr(post, "embed", None))
@@ -247,26 +473,113 @@ def crawl_bsky_actor(actor: str):
             if not cursor:
                 break
 
+    t_ins = time.monotonic()
+    if rows and SPOOL_ENABLED:
+        # counted as new: the watermark already filtered out stored posts
+        inserted_total = spool.write_rows("posts_bsky", rows)
+    elif rows:
+        with get_pool(DATABASE_URL).connection() as conn:
+            inserted_total = insert_bsky_posts(conn, rows, copy=DB_BULK_COPY)
     if rows:
-        conn = get_conn(DATABASE_URL)
-        try:
-            inserted_total = insert_bsky_posts(conn, rows)
-        finally:
-            conn.close()
+        STORE_SECONDS.observe(time.monotonic() - t_ins, source="bsky", name=actor)
 
     if next_cursor:
-        cursors[actor] = next_cursor
-        save_json(BSKY_CURSORS_PATH, cursors)
-
-    logger.info(f"bsky: actor={actor} inserted_total={inserted_total}")
-    return {"actor": actor, "inserted_total": inserted_total}
-
-def main():
-    # IMPORTANT: BSKY_ACTORS is now coming from the env / config we just loaded
-    w = Worker(queues=['default', 'crawl'])
+        store.put("bsky_cursor", actor, next_cursor)
+
+    # move the watermark to the newest row we just stored, keeping the
+    # stream's fields; if another job (or the stream) already moved it, keep theirs
+    newest = None
+    for r in rows:
+        r_dt = _parse_bsky_dt(r["created_at"])
+        if r_dt is not None and (newest is None or r_dt > newest[0]):
+            newest = (r_dt, r)
+    if newest is not None and (wm_dt is None or newest[0] > wm_dt):
+        new_wm = json.dumps(dict(wm, indexed_at=newest[0].isoformat(), uri=newest[1]["uri"]))
+        store.compare_and_set("bsky_watermark", actor, wm_raw, new_wm)
+    record_yield(store, source_key("bsky", actor), inserted_total, POLL_EWMA_ALPHA)
+    ROWS_STORED.inc(inserted_total, source="bsky", name=actor)
+
+    feed_s = sum(feed_latencies)
+    feed_max_s = max(feed_latencies, default=0.0)
+    logger.info(
+        f"bsky: actor={actor} inserted_total={inserted_total} rows={len(rows)} "
+        f"head_pages={head_pages} reached_watermark={reached_watermark} "
+        f"feed_calls={len(feed_latencies)} feed_s={feed_s:.2f} feed_max_s={feed_max_s:.2f} "
+        f"rate={BSKY_LIMITER.rate:.2f}/s throttled={BSKY_LIMITER.throttled}"
+    )
+    return {
+        "actor": actor,
+        "inserted_total": inserted_total,
+        "head_pages": head_pages,
+        "feed_calls": len(feed_latencies),
+        "feed_s": round(feed_s, 3),
+    }
+
+def crawl_bsky_actors(actors: List[str]):
+    """
+    Batch job: crawl several actors at once (BSKY_MAX_INFLIGHT threads).
+    They share the process-wide Bluesky client and rate limiter; one actor
+    failing does not fail the others.
+    """
+    with track_job("crawl_bsky_actors"):
+        return _crawl_bsky_actors(actors)
+
+def _crawl_bsky_actors(actors: List[str]):
+    t_start = time.monotonic()
+    results = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, BSKY_MAX_INFLIGHT)) as pool:
+        futures = {pool.submit(crawl_bsky_actor, a): a for a in actors}
+        for fut in as_completed(futures):
+            actor = futures[fut]
+            try:
+                results[actor] = fut.result()
+            except Exception as e:
+                failed += 1
+                logger.warning(f"bsky: batch actor={actor} failed: {e}")
+                results[actor] = {"actor": actor, "error": str(e)}
+
+    inserted = sum((r or {}).get("inserted_total", 0) for r in results.values())
+    total_s = time.monotonic() - t_start
+    logger.info(
+        f"bsky: batch actors={len(actors)} failed={failed} inserted_total={inserted} "
+        f"total_s={total_s:.2f} throttled={BSKY_LIMITER.throttled}"
+    )
+    return {"actors": len(actors), "failed": failed, "inserted_total": inserted,
+            "seconds": round(total_s, 3), "per_actor": results}
+
+def _serve_metrics(port: int = METRICS_PORT):
+    db_pool = get_pool(DATABASE_URL)
+    for state in ("size", "idle", "in_use"):
+        metrics.DB_POOL.set_function(lambda s=state: db_pool.stats()[s], state=state)
+    metrics.start_http_server(port)
+
+def run(queues: List[str], concurrency: int = 1, metrics_port: int = METRICS_PORT,
+        chan_share: float = 1.0, bsky_share: float = 1.0):
+    """
+    Consume queues (first = highest priority) with up to `concurrency` jobs
+    at once. Jobs run on threads of this process, so they share its HTTP
+    sessions, rate limiters, DB pool and /metrics. chan_share / bsky_share
+    scale the request budgets when several processes split them (runner.py).
+    """
+    CHAN_LIMITER.scale(chan_share)
+    BSKY_LIMITER.scale(bsky_share)
+    _serve_metrics(metrics_port)
+    if SPOOL_ENABLED and SPOOL_FLUSHER_THREAD:
+        spool.start_flusher_thread()
+    w = Worker(queues=queues, concurrency=concurrency, use_threads=True,
+               disconnect_wait=WORKER_SHUTDOWN_SECONDS)
     w.register('crawl_board', crawl_board)
     w.register('crawl_bsky_actor', crawl_bsky_actor)
+    w.register('crawl_bsky_actors', crawl_bsky_actors)
+    logger.info(f"worker: queues={queues} concurrency={concurrency} metrics_port={metrics_port} "
+                f"chan_rps={CHAN_LIMITER.rate:.2f} bsky_rps={BSKY_LIMITER.rate:.2f}")
     w.run()
 
+def main():
+    # IMPORTANT: BSKY_ACTORS is now coming from the env / config we just loaded
+    # one process for every queue; runner.py runs a process pool per queue
+    run([CHAN_QUEUE, BSKY_QUEUE] + WORKER_LEGACY_QUEUES)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,87 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bsky_stream import INDEX_SKEW, advance_watermarks, event_to_row, stream_floor
+from state import StateStore
+
+DID = "did:plc:abc"
+T0 = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = StateStore(tmp_path / "state.sqlite")
+    yield s
+    s.close()
+
+
+def _event(rkey, at, text="hi", embed=None):
+    record = {"$type": "app.bsky.feed.post", "text": text, "createdAt": at.isoformat()}
+    if embed is not None:
+        record["embed"] = embed
+    return {
+        "did": DID,
+        "time_us": int(at.timestamp() * 1e6),
+        "kind": "commit",
+        "commit": {"operation": "create", "collection": "app.bsky.feed.post",
+                   "rkey": rkey, "cid": "bafy" + rkey, "record": record},
+    }
+
+
+def test_event_row_is_dumped_like_a_polled_post():
+    embed = {"$type": "app.bsky.embed.external",
+             "external": {"uri": "https://x", "title": "t", "description": "d"}}
+    row = event_to_row(_event("1", T0, embed=embed), {DID: "a.bsky.social"})
+    data = json.loads(row["data"])
+    assert data["author"]["handle"] == "a.bsky.social"
+    assert data["record"]["py_type"] == "app.bsky.feed.post"
+    assert data["record"]["created_at"] == T0.isoformat()
+    assert "createdAt" not in data["record"] and "$type" not in data["record"]
+    assert data["indexed_at"] == T0.isoformat()
+    assert row["created_at"] == T0 and row["has_media"]
+    assert event_to_row(_event("1", T0), {}) is None
+
+
+def _rows(*offsets):
+    return [event_to_row(_event(str(i), T0 + timedelta(minutes=m)), {DID: "a"})
+            for i, m in enumerate(offsets)]
+
+
+def test_stream_keeps_its_own_fields(store):
+    polled = {"indexed_at": (T0 - timedelta(minutes=1)).isoformat(), "uri": "at://polled"}
+    store.put("bsky_watermark", "a", json.dumps(polled))
+
+    assert advance_watermarks(store, _rows(0, 10, 5)) == 1
+    wm = json.loads(store.get("bsky_watermark", "a"))
+    assert wm["indexed_at"] == polled["indexed_at"] and wm["uri"] == "at://polled"
+    assert wm["stream_at"] == (T0 + timedelta(minutes=10)).isoformat()
+    assert wm["stream_uri"].endswith("/1")
+    assert wm["stream_since"] == T0.isoformat()
+
+    # older rows do not move stream_at back, nor a resumed run stream_since
+    advance_watermarks(store, _rows(3))
+    wm = json.loads(store.get("bsky_watermark", "a"))
+    assert wm["stream_at"] == (T0 + timedelta(minutes=10)).isoformat()
+    assert wm["stream_since"] == T0.isoformat()
+    assert stream_floor(wm) == T0 + timedelta(minutes=10) - INDEX_SKEW
+
+
+def test_no_floor_across_a_gap(store):
+    # the poller last stored a post an hour before the stream started:
+    # nobody has what was posted in between
+    polled = {"indexed_at": (T0 - timedelta(hours=1)).isoformat(), "uri": "at://polled"}
+    store.put("bsky_watermark", "a", json.dumps(polled))
+    advance_watermarks(store, _rows(0, 10))
+    assert stream_floor(json.loads(store.get("bsky_watermark", "a"))) is None
+
+    # a run without a saved cursor starts its coverage again
+    restart = {"a"}
+    wm = json.loads(store.get("bsky_watermark", "a"))
+    store.put("bsky_watermark", "a", json.dumps(dict(wm, indexed_at=T0.isoformat())))
+    advance_watermarks(store, _rows(30), restart)
+    wm = json.loads(store.get("bsky_watermark", "a"))
+    assert wm["stream_since"] == (T0 + timedelta(minutes=30)).isoformat()
+    assert stream_floor(wm) is None
+    assert restart == set()
@@ -0,0 +1,136 @@
+import json
+import subprocess
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+import db
+import spool
+
+
+class FakeDB:
+    """Stands in for Postgres in Flusher.flush_once; can be told to fail."""
+
+    def __init__(self):
+        self.rows = {"posts_4chan": [], "posts_bsky": []}
+        self.fail = False
+
+    def _insert(self, table):
+        def insert(conn, rows, copy=False):
+            if self.fail:
+                raise RuntimeError("database is down")
+            self.rows[table].extend(rows)
+            return len(rows)
+        return insert
+
+    def install(self, monkeypatch):
+        class Pool:
+            @contextmanager
+            def connection(self):
+                yield None
+
+        monkeypatch.setattr(db, "get_pool", lambda url: Pool())
+        monkeypatch.setattr(db, "insert_4chan_posts", self._insert("posts_4chan"))
+        monkeypatch.setattr(db, "insert_bsky_posts", self._insert("posts_bsky"))
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    f = FakeDB()
+    f.install(monkeypatch)
+    return f
+
+
+def _rows(n, start=0):
+    return [{"board_name": "sp", "post_number": i} for i in range(start, start + n)]
+
+
+def _dead_pid():
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+
+def test_segment_seals_on_close(tmp_path):
+    seg = spool.Segment(tmp_path, fsync_bytes=1 << 20)
+    seg.append("posts_4chan", _rows(3))
+    assert seg.path.exists() and not list(tmp_path.glob("*.seg"))
+    seg.close()
+    sealed = list(tmp_path.glob("*.seg"))
+    assert len(sealed) == 1 and not list(tmp_path.glob("*.open"))
+    assert len(sealed[0].read_bytes().splitlines()) == 3
+
+    empty = spool.Segment(tmp_path)
+    empty.close()
+    assert not empty.path.exists() and len(list(tmp_path.glob("*.seg"))) == 1
+
+
+def test_flush_loads_in_batches_and_checkpoints(tmp_path, fake_db):
+    with spool.Segment(tmp_path) as seg:
+        seg.append("posts_4chan", _rows(5))
+    with spool.Segment(tmp_path) as seg:
+        seg.append("posts_bsky", [{"uri": "at://a"}])
+    fl = spool.Flusher(tmp_path, batch_rows=3, url="unused")
+
+    assert fl.flush_once() == 3
+    first = fl.pending_segments()[0].name
+    assert json.loads((tmp_path / "checkpoint.json").read_text())[first] > 0
+    assert fl.flush_once() == 3
+    assert fl.flush_once() == 0
+    assert [r["post_number"] for r in fake_db.rows["posts_4chan"]] == [0, 1, 2, 3, 4]
+    assert fake_db.rows["posts_bsky"] == [{"uri": "at://a"}]
+    assert fl.pending_segments() == []
+    assert json.loads((tmp_path / "checkpoint.json").read_text()) == {}
+
+
+def test_failed_insert_keeps_rows_and_checkpoint(tmp_path, fake_db):
+    with spool.Segment(tmp_path) as seg:
+        seg.append("posts_4chan", _rows(4))
+    fl = spool.Flusher(tmp_path, batch_rows=10, url="unused")
+
+    fake_db.fail = True
+    with pytest.raises(RuntimeError):
+        fl.flush_once()
+    assert len(fl.pending_segments()) == 1
+    assert not (tmp_path / "checkpoint.json").exists()
+
+    fake_db.fail = False
+    assert fl.flush_once() == 4
+    assert [r["post_number"] for r in fake_db.rows["posts_4chan"]] == [0, 1, 2, 3]
+
+
+def test_orphaned_open_segment_with_torn_tail_is_recovered(tmp_path, fake_db):
+    # a writer that died mid-line: complete lines load, the torn one is skipped
+    orphan = tmp_path / f"00000000000000000001-{_dead_pid()}-000001.open"
+    lines = [json.dumps({"t": "posts_4chan", "r": r}) for r in _rows(2)]
+    orphan.write_text("\n".join(lines) + '\n{"t": "posts_4chan", "r": {"boa')
+    # a live writer's segment is left alone
+    live = spool.Segment(tmp_path)
+    live.append("posts_4chan", _rows(1, start=10))
+
+    fl = spool.Flusher(tmp_path, batch_rows=100, url="unused")
+    assert fl.flush_once() == 2
+    assert not orphan.exists() and live.path.exists()
+    assert [r["post_number"] for r in fake_db.rows["posts_4chan"]] == [0, 1]
+
+    live.close()
+    assert fl.flush_once() == 1
+    assert fl.pending_segments() == []
+
+
+def test_restart_resumes_from_checkpoint(tmp_path, fake_db):
+    with spool.Segment(tmp_path) as seg:
+        seg.append("posts_4chan", _rows(6))
+    spool.Flusher(tmp_path, batch_rows=4, url="unused").flush_once()
+    # a new flusher process picks up after the checkpointed offset
+    fl = spool.Flusher(tmp_path, batch_rows=4, url="unused")
+    assert fl.flush_once() == 2
+    assert [r["post_number"] for r in fake_db.rows["posts_4chan"]] == list(range(6))
+
+
+def test_one_flusher_per_directory(tmp_path):
+    a = spool.Flusher(tmp_path, url="unused")
+    b = spool.Flusher(tmp_path, url="unused")
+    assert a.acquire()
+    assert not b.acquire()
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from poll_schedule import (
+    NS_INFLIGHT,
+    claim_source,
+    poll_interval,
+    read_rate,
+    record_yield,
+    release_source,
+)
+from state import StateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = StateStore(tmp_path / "state.sqlite")
+    yield s
+    s.close()
+
+
+def test_compare_and_set_absent_and_present(store):
+    assert store.compare_and_set("ns", "k", None, "a")
+    # the key exists now: "absent" no longer matches
+    assert not store.compare_and_set("ns", "k", None, "b")
+    assert not store.compare_and_set("ns", "k", "stale", "b")
+    assert store.get("ns", "k") == "a"
+    assert store.compare_and_set("ns", "k", "a", "b")
+    assert store.get("ns", "k") == "b"
+
+
+def test_advance_is_monotonic(store):
+    assert store.advance("seen", "sp", 10) == 10
+    assert store.advance("seen", "sp", 5) == 10
+    # a stale expected value is re-read, not overwritten
+    assert store.advance("seen", "sp", 7, expected="3") == 10
+    assert store.advance("seen", "sp", 12, expected="3") == 12
+    assert store.get("seen", "sp") == "12"
+
+
+def test_advance_concurrent_keeps_max(tmp_path):
+    path = tmp_path / "state.sqlite"
+    stores = [StateStore(path) for _ in range(4)]
+
+    def bump(s, values):
+        for v in values:
+            s.advance("seen", "pol", v)
+
+    threads = [threading.Thread(target=bump, args=(s, range(i, 400, 4))) for i, s in enumerate(stores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stores[0].get("seen", "pol") == "399"
+    for s in stores:
+        s.close()
+
+
+def test_prune_and_get_many(store):
+    store.put_many("meta", {"1": "a", "2": "b", "3": "c"})
+    store.put("other", "1", "x")
+    assert store.prune("meta", ["2", 3]) == 1
+    assert store.get_many("meta", ["1", "2", "3"]) == {"2": "b", "3": "c"}
+    assert store.items("other") == {"1": "x"}
+
+
+def test_claim_blocks_until_released(store):
+    assert claim_source(store, "chan:sp", ttl=900, now=1000.0)
+    assert not claim_source(store, "chan:sp", ttl=900, now=1500.0)
+    assert claim_source(store, "chan:pol", ttl=900, now=1500.0)
+    release_source(store, "chan:sp")
+    assert store.get(NS_INFLIGHT, "chan:sp") is None
+    assert claim_source(store, "chan:sp", ttl=900, now=1501.0)
+
+
+def test_expired_claim_is_taken_over_once(tmp_path):
+    path = tmp_path / "state.sqlite"
+    a, b = StateStore(path), StateStore(path)
+    assert claim_source(a, "bsky:x", ttl=900, now=1000.0)
+    # both see the same expired claim; only one compare-and-set wins
+    raw = a.get(NS_INFLIGHT, "bsky:x")
+    assert a.compare_and_set(NS_INFLIGHT, "bsky:x", raw, "2000.0")
+    assert not claim_source(b, "bsky:x", ttl=900, now=1000.0 + 900)
+    assert claim_source(b, "bsky:x", ttl=900, now=2000.0 + 900)
+    a.close()
+    b.close()
+
+
+def test_record_yield_ewma(store):
+    # the first job only starts the clock
+    assert record_yield(store, "chan:sp", 50, alpha=0.5, now=0.0) is None
+    assert record_yield(store, "chan:sp", 100, alpha=0.5, now=100.0) == pytest.approx(1.0)
+    assert record_yield(store, "chan:sp", 0, alpha=0.5, now=200.0) == pytest.approx(0.5)
+    assert read_rate(store, "chan:sp") == pytest.approx(0.5)
+    assert read_rate(store, "chan:pol") is None
+
+
+def test_poll_interval_clamps():
+    assert poll_interval(None, 60, 900, 20) == 60
+    assert poll_interval(0.0, 60, 900, 20) == 900
+    assert poll_interval(0.1, 60, 900, 20) == pytest.approx(200)
+    assert poll_interval(10.0, 60, 900, 20) == 60
+    assert poll_interval(0.001, 60, 900, 20) == 900
+
+
+def test_claim_store_problem(store):
+    from poll_schedule import claim_store_problem, mark_producer
+
+    assert "no producer" in claim_store_problem(store, "crawl1", max_age=900, now=1000.0)
+    mark_producer(store, "crawl1", now=1000.0)
+    assert claim_store_problem(store, "crawl1", max_age=900, now=1500.0) is None
+    assert "crawl2" in claim_store_problem(store, "crawl2", max_age=900, now=1500.0)
+    assert "ago" in claim_store_problem(store, "crawl1", max_age=900, now=3000.0)
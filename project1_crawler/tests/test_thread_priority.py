@@ -0,0 +1,41 @@
+from thread_priority import catalog_entries, expected_new, is_last_chance, prioritize
+
+
+def _catalog(pages):
+    # pages = [[(no, replies), ...], ...]
+    return [{"page": i + 1, "threads": [{"no": no, "replies": r, "time": 0} for no, r in threads]}
+            for i, threads in enumerate(pages)]
+
+
+def test_expected_new_and_last_chance():
+    entries = catalog_entries(_catalog([[(1, 5)], [(2, 0)], [(3, 9)]]))
+    assert [e["page"] for e in entries] == [1, 2, 3]
+    assert expected_new(entries[0], None) == 6
+    assert expected_new(entries[0], {"replies": 3}) == 2
+    assert expected_new(entries[0], {"replies": 8}) == 0
+    assert [is_last_chance(e, 1) for e in entries] == [False, False, True]
+    assert not any(is_last_chance(e, 0) for e in entries)
+
+
+def test_prioritize_orders_and_cuts_at_budget():
+    entries = catalog_entries(_catalog([[(1, 10), (2, 1)], [(3, 4)], [(4, 2), (5, 0)]]))
+    old = {"1": {"replies": 10}, "5": {"replies": 0}}
+    fetch, deferred = prioritize(entries, old, budget=2, page_weight=1.0, bottom_pages=1, now=0)
+    # thread 1 has nothing new; 3 and 4 are ahead of 2 on the lower pages
+    assert [e["no"] for e in fetch] == [3, 4]
+    assert [e["no"] for e in deferred] == [2, 1, 5]
+
+
+def test_last_chance_threads_bypass_budget():
+    entries = catalog_entries(_catalog([[(1, 50), (2, 40)], [(3, 0)], [(4, 1), (5, 0)]]))
+    old = {"5": {"replies": 0}}
+    fetch, deferred = prioritize(entries, old, budget=1, page_weight=0.0, bottom_pages=1, now=0)
+    assert [e["no"] for e in fetch] == [1, 4]
+    # last chance but nothing new: still deferred
+    assert 5 in [e["no"] for e in deferred]
+
+
+def test_no_budget_returns_everything():
+    entries = catalog_entries(_catalog([[(1, 1)], [(2, 2)]]))
+    fetch, deferred = prioritize(entries, {}, budget=0)
+    assert len(fetch) == 2 and deferred == []
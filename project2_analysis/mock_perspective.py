@@ -0,0 +1,113 @@
+"""
+Local stand-in for the Perspective comments:analyze endpoint, to measure
+PerspectiveScorer throughput without spending quota.
+
+    python mock_perspective.py                       # serve on :8765
+    python mock_perspective.py --bench 2000 --qps 50 --quota 40 --latency 0.15
+
+The mock admits --quota requests per second (429 + Retry-After beyond
+that, like the real API) and answers after --latency seconds with a score
+derived from the text hash. --bench runs the scorer against it and prints
+the achieved rate next to what the old one-request-then-sleep(1) loop
+would have managed.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from perspective_client import PerspectiveScorer, TokenBucket
+
+
+def fake_score(text, attr):
+    h = hashlib.sha1(f"{attr}|{text}".encode()).digest()
+    return int.from_bytes(h[:4], "big") / 2 ** 32
+
+
+class _Quota(TokenBucket):
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.qps)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+def make_server(port=8765, quota=10.0, latency=0.1):
+    bucket = _Quota(quota, burst=max(quota / 10, 1.0))
+    counts = {"ok": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, headers=()):
+            raw = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if quota > 0 and not bucket.try_acquire():
+                with lock:
+                    counts["throttled"] += 1
+                self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                           [("Retry-After", "1")])
+                return
+            time.sleep(latency)
+            text = body.get("comment", {}).get("text", "")
+            scores = {a: {"summaryScore": {"value": fake_score(text, a), "type": "PROBABILITY"}}
+                      for a in body.get("requestedAttributes", {})}
+            with lock:
+                counts["ok"] += 1
+            self._send(200, {"attributeScores": scores, "languages": ["en"]})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.counts = counts
+    return server
+
+
+def bench(n, qps, workers, quota, latency, port):
+    server = make_server(port, quota, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scorer = PerspectiveScorer("mock", qps=qps, workers=workers,
+                               url=f"http://127.0.0.1:{port}/v1alpha1/comments:analyze")
+    t0 = time.monotonic()
+    got = sum(1 for _ in scorer.score_many((i, f"post number {i}") for i in range(n)))
+    dt = time.monotonic() - t0
+    server.shutdown()
+    print(f"scored {got} texts in {dt:.1f}s = {got / dt:.1f}/s "
+          f"(qps budget {qps}, server quota {quota}/s, latency {latency * 1000:.0f}ms, workers {workers})")
+    print(f"client: {scorer.stats}  final qps {scorer.bucket.qps:.1f}")
+    print(f"server: {server.counts}")
+    print(f"old sequential loop: ~{1 / (latency + 1.0):.2f}/s -> {n * (latency + 1.0) / 60:.1f} min for {n}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--quota", type=float, default=10.0, help="requests/s the mock admits (0 = unlimited)")
+    ap.add_argument("--latency", type=float, default=0.1, help="seconds per answered request")
+    ap.add_argument("--bench", type=int, default=0, help="score this many texts against the mock and exit")
+    ap.add_argument("--qps", type=float, default=10.0, help="bench: client QPS budget")
+    ap.add_argument("--workers", type=int, default=16, help="bench: client threads")
+    args = ap.parse_args()
+    if args.bench:
+        bench(args.bench, args.qps, args.workers, args.quota, args.latency, args.port)
+    else:
+        print(f"mock Perspective on http://127.0.0.1:{args.port}/v1alpha1/comments:analyze")
+        make_server(args.port, args.quota, args.latency).serve_forever()
@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import requests
+
+API_URL = "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze"
+ATTRIBUTES = ("TOXICITY", "SEVERE_TOXICITY")
+MAX_CHARS = 2000
+
+
+def request_text(text):
+    """The comment text score() sends for text (score_cache keys on it too)."""
+    return (text or "")[:MAX_CHARS]
+
+
+class TokenBucket:
+    """
+    QPS budget shared by all scoring threads. After a 429/503 the rate is
+    halved and everyone waits out the pause; successes then add back about
+    5% of the configured rate per second (never above it).
+    """
+
+    def __init__(self, qps, burst=1.0, min_qps=None):
+        self.max_qps = float(qps)
+        self.qps = self.max_qps
+        self.min_qps = min_qps if min_qps is not None else self.max_qps / 20
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.max_qps <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * self.qps)
+                    self._last = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    delay = (1.0 - self._tokens) / self.qps
+            time.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            # +5% of the configured rate per second's worth of successes
+            self.qps = min(self.max_qps, self.qps + 0.05 * self.max_qps / max(self.qps, 1.0))
+
+    def on_throttled(self, pause):
+        with self._lock:
+            now = time.monotonic()
+            # the other threads' 429s from the same burst arrive during the
+            # pause; count them as one event
+            if now >= self._paused_until:
+                self.qps = max(self.min_qps, self.qps / 2)
+                self._paused_until = now + pause
+                self._tokens = 0.0
+
+
+def _retry_after(r):
+    try:
+        return float(r.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class PerspectiveScorer:
+    """
+    Scores texts on a thread pool, at most `qps` requests per second.
+    score() returns {attribute: value}, NaN where the API gave nothing.
+    """
+
+    def __init__(self, api_key, qps=1.0, workers=8, url=API_URL, attributes=ATTRIBUTES,
+                 retries=6, timeout=30, max_backoff=64.0):
+        self.api_key = api_key
+        self.url = url
+        self.attributes = tuple(attributes)
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(qps)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "failed": 0}
+
+    def _session(self):
+        # one keep-alive session per thread
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+        return s
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _empty(self):
+        return {a: np.nan for a in self.attributes}
+
+    def _parse(self, data):
+        out = self._empty()
+        for a in self.attributes:
+            try:
+                out[a] = data["attributeScores"][a]["summaryScore"]["value"]
+            except (KeyError, TypeError):
+                pass
+        return out
+
+    def score(self, text):
+        payload = {
+            "comment": {"text": request_text(text)},
+            "languages": ["en"],
+            "requestedAttributes": {a: {} for a in self.attributes},
+        }
+        for attempt in range(self.retries):
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                r = self._session().post(self.url, params={"key": self.api_key},
+                                         json=payload, timeout=self.timeout)
+            except requests.RequestException:
+                self._count("errors")
+                time.sleep(min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1.0))
+                continue
+            if r.status_code == 200:
+                self._count("ok")
+                self.bucket.on_success()
+                return self._parse(r.json())
+            if r.status_code in (429, 503):
+                # back off everyone, not just this thread: the quota is shared
+                self._count("throttled")
+                pause = _retry_after(r)
+                if pause is None:
+                    pause = min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1.0)
+                self.bucket.on_throttled(pause)
+                continue
+            # 400 (unsupported language, empty text, ...) will not get better
+            break
+        self._count("failed")
+        return self._empty()
+
+    def score_many(self, items):
+        """
+        items = iterable of (key, text); yields (key, scores) as they finish.
+        At most 2 * workers requests are queued at a time.
+        """
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+            for key, text in items:
+                pending[pool.submit(self.score, text)] = key
+                if len(pending) >= 2 * self.workers:
+                    break
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield pending.pop(fut), fut.result()
+                    nxt = next(items, None)
+                    if nxt is not None:
+                        pending[pool.submit(self.score, nxt[1])] = nxt[0]
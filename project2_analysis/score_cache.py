@@ -0,0 +1,76 @@
+import hashlib
+import sqlite3
+
+import numpy as np
+
+from perspective_client import request_text
+
+# bumped when the key derivation changes, so older entries are not reused
+_KEY_VERSION = "2"
+
+
+class ScoreCache:
+    """
+    Perspective scores on disk (SQLite), keyed by a hash of the exact text
+    sent to the API (perspective_client.request_text) plus the requested
+    attributes, so reruns and repeated texts
+    (reposts, copypasta) cost no API calls. Failed (NaN) scores are not stored.
+    """
+
+    def __init__(self, path, attributes, languages=("en",)):
+        self.attributes = tuple(attributes)
+        self._salt = (_KEY_VERSION + "|" + "|".join(sorted(self.attributes))
+                      + "|" + ",".join(languages))
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, "
+            + ", ".join(f"{a.lower()} REAL" for a in self.attributes) + ")"
+        )
+        # a cache file from a run with other attributes gains their columns
+        have = {r[1] for r in self.db.execute("PRAGMA table_info(scores)")}
+        for a in self.attributes:
+            if a.lower() not in have:
+                self.db.execute(f"ALTER TABLE scores ADD COLUMN {a.lower()} REAL")
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return hashlib.sha256((self._salt + "\x00" + request_text(text)).encode()).hexdigest()
+
+    def get_many(self, keys):
+        """{key: {attribute: value}} for the keys already scored."""
+        keys = list(keys)
+        cols = ", ".join(a.lower() for a in self.attributes)
+        found = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            q = f"SELECT key, {cols} FROM scores WHERE key IN ({','.join('?' * len(part))})"
+            for row in self.db.execute(q, part):
+                found[row[0]] = dict(zip(self.attributes, row[1:]))
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, scores):
+        if any(np.isnan(scores[a]) for a in self.attributes):
+            return
+        cols = ", ".join(a.lower() for a in self.attributes)
+        self.db.execute(
+            f"INSERT OR REPLACE INTO scores (key, {cols}) VALUES (?{', ?' * len(self.attributes)})",
+            [key] + [scores[a] for a in self.attributes],
+        )
+
+    def commit(self):
+        self.db.commit()
+
+    def hit_rate(self):
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.0
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
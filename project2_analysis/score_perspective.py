@@ -4,9 +4,18 @@ import json
 from pathlib import Path
 import numpy as np
 import pandas as pd
-import requests
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from tqdm import tqdm
 from dotenv import load_dotenv, find_dotenv
+from perspective_client import PerspectiveScorer, API_URL
+from score_cache import ScoreCache
+
+# orjson is optional; it parses the Bluesky records about 1.5x as fast as json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 load_dotenv(find_dotenv())
 API_KEY = os.getenv("PERSPECTIVE_API_KEY")
@@ -16,10 +25,24 @@ DATA_DIR = Path("data")
 OUT_DIR = Path("out"); OUT_DIR.mkdir(exist_ok=True)
 OUT_PARQ = OUT_DIR / "posts_scored.parquet"
 OUT_CSV  = OUT_DIR / "posts_scored.csv"
+# scores by request-text hash, shared by every run (delete to rescore)
+CACHE_DB = Path(os.getenv("SCORE_CACHE", str(OUT_DIR / "score_cache.sqlite3")))
+# checkpoints: one small parquet per batch with only the newly scored ids
+SHARD_DIR = OUT_DIR / "scored_shards"; SHARD_DIR.mkdir(exist_ok=True)
+SCORE_COLS = ["toxicity", "severe_toxicity"]
 
 SAMPLE_PER_SOURCE = 10000
-PER_REQUEST_SLEEP = 1.0
+# CSV loading: rows used to pick the time/text columns, then only those are
+# read, in blocks of this many bytes (pandas fallback: rows per chunk)
+CSV_SAMPLE_ROWS = 2000
+CSV_BLOCK_BYTES = 2 << 20
+CSV_CHUNK_ROWS = 100000
 BATCH_SIZE = 100
+# request budget for the API key (Perspective's default quota is 1 QPS) and
+# threads scoring at once; PERSPECTIVE_URL can point at mock_perspective.py
+PERSPECTIVE_QPS = float(os.getenv("PERSPECTIVE_QPS", "1"))
+PERSPECTIVE_WORKERS = int(os.getenv("PERSPECTIVE_WORKERS", "8"))
+PERSPECTIVE_URL = os.getenv("PERSPECTIVE_URL", API_URL)
 
 COLUMN_HINTS = {
     "bluesky_posts.csv": {"text": "record", "time": "indexed_at"},
@@ -34,31 +57,32 @@ def guess_source(path):
     if any(x in name for x in ["bsky","blue","bluesky"]): return "bsky"
     return name.replace(".csv","")
 
-def pick_time_series(df, path, hints):
+def time_unit(s):
+    """How to turn column s into timestamps: "s"/"ms" epochs or "parse" strings."""
+    if pd.api.types.is_numeric_dtype(s):
+        s = pd.to_numeric(s, errors="coerce")
+        return "ms" if s.dropna().median() > 1e12 else "s"
+    return "parse"
+
+def to_time(s, how):
+    if how == "parse":
+        return pd.to_datetime(s, utc=True, errors="coerce")
+    return pd.to_datetime(pd.to_numeric(s, errors="coerce"), unit=how, utc=True, errors="coerce")
+
+def pick_time_column(df, path, hints):
+    """(column, how) for the timestamp, decided on a sample of the file."""
     if "time" in hints and hints["time"] in df.columns:
         col = hints["time"]
-        s = df[col]
-        if pd.api.types.is_numeric_dtype(s):
-            s = pd.to_numeric(s, errors="coerce")
-            unit = "ms" if s.dropna().median() > 1e12 else "s"
-            dt = pd.to_datetime(s, unit=unit, utc=True, errors="coerce")
-        else:
-            dt = pd.to_datetime(s, utc=True, errors="coerce")
-        if dt.notna().any():
+        how = time_unit(df[col])
+        if to_time(df[col], how).notna().any():
             print(f"  time: using hint column '{col}'")
-            return dt
+            return col, how
     for col in ["created_at","createdAt","indexed_at","indexedAt","time","timestamp","ts","date"]:
         if col in df.columns:
-            s = df[col]
-            if pd.api.types.is_numeric_dtype(s):
-                s = pd.to_numeric(s, errors="coerce")
-                unit = "ms" if s.dropna().median() > 1e12 else "s"
-                dt = pd.to_datetime(s, unit=unit, utc=True, errors="coerce")
-            else:
-                dt = pd.to_datetime(s, utc=True, errors="coerce")
-            if dt.notna().mean() > 0.3:
+            how = time_unit(df[col])
+            if to_time(df[col], how).notna().mean() > 0.3:
                 print(f"  time: picked '{col}'")
-                return dt
+                return col, how
     best = None
     best_ok = 0.0
     for col in df.columns:
@@ -66,55 +90,66 @@ def pick_time_series(df, path, hints):
         if s.notna().mean() < 0.6:
             continue
         for unit in ["s","ms"]:
-            dt = pd.to_datetime(s, unit=unit, utc=True, errors="coerce")
-            ok = dt.notna().mean()
+            ok = pd.to_datetime(s, unit=unit, utc=True, errors="coerce").notna().mean()
             if ok > best_ok:
                 best_ok = ok
-                best = dt
+                best = (col, unit)
     if best is not None and best_ok > 0.6:
         print("  time: picked a numeric column by guessing seconds/ms")
         return best
     raise ValueError(f"Could not find a usable timestamp in {path.name}. Columns: {list(df.columns)}")
 
+def _record_text(v):
+    # same result as json.loads(v).get("text"): orjson rejects some input the
+    # stdlib takes (NaN/Infinity, lone surrogates) and turns integers beyond
+    # 64 bits into floats, so anything but a string text is parsed again by json
+    if orjson is not None:
+        try:
+            obj = orjson.loads(v)
+            if not isinstance(obj, dict):
+                return ""
+            txt = obj.get("text")
+            if txt is None or isinstance(txt, str):
+                return txt or ""
+        except orjson.JSONDecodeError:
+            pass
+    obj = json.loads(v)
+    if isinstance(obj, dict):
+        return str(obj.get("text") or "")
+    return ""
+
 def parse_record_to_text(series):
     out = []
     for v in series.astype(str):
-        txt = ""
         try:
-            obj = json.loads(v)
-            if isinstance(obj, dict):
-                txt = str(obj.get("text") or "")
-            else:
-                txt = ""
+            out.append(_record_text(v))
         except Exception:
-            txt = ""
-        out.append(txt)
+            out.append("")
     s = pd.Series(out, index=series.index)
     return s
 
-def pick_text_series(df, path, hints):
+def pick_text_column(df, path, hints):
+    """(column, is_json) for the post text, decided on a sample of the file."""
     if "text" in hints and hints["text"] in df.columns:
         col = hints["text"]
         if col == "record":
-            s = parse_record_to_text(df[col])
-            if s.str.len().sum() > 0:
+            if parse_record_to_text(df[col]).str.len().sum() > 0:
                 print("  text: using 'record' (JSON → text)")
-                return s.fillna("").str.strip()
+                return col, True
         else:
             print(f"  text: using hint column '{col}'")
-            return df[col].astype(str).fillna("").str.strip()
+            return col, False
     for col in ["body","text","com","comment","content","message","full_text","body_text"]:
         if col in df.columns:
             print(f"  text: picked '{col}'")
-            return df[col].astype(str).fillna("").str.strip()
+            return col, False
     for col in df.columns:
         if df[col].dtype == object:
             s = df[col].astype(str)
             if s.str.contains('"text"').mean() > 0.2:
-                parsed = parse_record_to_text(s)
-                if parsed.str.len().sum() > 0:
+                if parse_record_to_text(s).str.len().sum() > 0:
                     print(f"  text: parsed JSON from '{col}'")
-                    return parsed.fillna("").str.strip()
+                    return col, True
     best_col = None
     best_score = -1.0
     for col in df.columns:
@@ -132,35 +167,76 @@ def pick_text_series(df, path, hints):
                 best_col = col
     if best_col is not None:
         print(f"  text: picked longest-looking column '{best_col}'")
-        return df[best_col].astype(str).fillna("").str.strip()
+        return best_col, False
     raise ValueError(f"Could not find a text/body column in {path.name}.")
 
+def _arrow_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype):
+        return pa.int64()
+    if pd.api.types.is_float_dtype(dtype):
+        return pa.float64()
+    return pa.string()
+
+def read_chunks(path, cols, sample):
+    """Stream only `cols` of the CSV with pyarrow's block reader, typed like the sample."""
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=cols,
+            column_types={c: _arrow_type(sample[c].dtype) for c in cols},
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
 def load_one_csv(path):
     print(f"\nLoading {path.name} ...")
     hints = COLUMN_HINTS.get(path.name, {})
-    df = pd.read_csv(path, low_memory=False)
-    df["source"] = guess_source(path)
-    df["created_at"] = pick_time_series(df, path, hints)
-    df["body"]       = pick_text_series(df, path, hints)
-    if "thread_number" not in df.columns:
-        for c in ["thread_id","thread","tid","root","root_id","resto"]:
-            if c in df.columns:
-                df = df.rename(columns={c: "thread_number"})
-                break
-    if "board_name" not in df.columns and "board" in df.columns:
-        df = df.rename(columns={"board": "board_name"})
-    if "id" not in df.columns:
-        df["id"] = (
-            path.name + "|" +
-            df["created_at"].astype(str) + "|" +
-            df["body"].astype(str).str.slice(0, 64)
-        )
+    # decide on columns from a sample, then read only those
+    sample = pd.read_csv(path, nrows=CSV_SAMPLE_ROWS)
+    time_col, how = pick_time_column(sample, path, hints)
+    text_col, is_json = pick_text_column(sample, path, hints)
+    thread_col = next((c for c in ["thread_number","thread_id","thread","tid","root","root_id","resto"]
+                       if c in sample.columns), None)
+    board_col = next((c for c in ["board_name","board"] if c in sample.columns), None)
+    id_col = "id" if "id" in sample.columns else None
+    cols = list(dict.fromkeys(c for c in [id_col, time_col, text_col, thread_col, board_col] if c))
+
+    source = guess_source(path)
     need = ["id","source","board_name","thread_number","created_at","body"]
-    for c in need:
-        if c not in df.columns:
-            df[c] = pd.NA
-    print(f"  rows: {len(df)}  (source={df['source'].iloc[0]})")
-    return df[need]
+    def convert(chunk):
+        out = pd.DataFrame(index=chunk.index)
+        out["source"] = source
+        out["created_at"] = to_time(chunk[time_col], how)
+        text = parse_record_to_text(chunk[text_col]) if is_json else chunk[text_col].astype(str)
+        out["body"] = text.fillna("").str.strip()
+        out["board_name"] = chunk[board_col] if board_col else pd.NA
+        out["thread_number"] = chunk[thread_col] if thread_col else pd.NA
+        if id_col:
+            out["id"] = chunk[id_col]
+        else:
+            out["id"] = (
+                path.name + "|" +
+                out["created_at"].astype(str) + "|" +
+                out["body"].astype(str).str.slice(0, 64)
+            )
+        return out[need]
+
+    # only the converted columns are kept, so memory follows the output, not the file
+    try:
+        parts = [convert(c) for c in read_chunks(path, cols, sample)]
+    except pa.ArrowInvalid as e:
+        # a later block does not fit the sample's types: start over with pandas,
+        # everything but the timestamp as text so all chunks agree
+        print(f"  pyarrow reader gave up ({str(e)[:80]}); reading with pandas")
+        dtypes = {c: str for c in cols if c != time_col}
+        parts = [convert(c) for c in pd.read_csv(path, usecols=cols, dtype=dtypes,
+                                                  chunksize=CSV_CHUNK_ROWS)]
+    df = pd.concat(parts, ignore_index=True)
+    print(f"  rows: {len(df)}  (source={source})")
+    return df
 
 files = sorted(DATA_DIR.glob("*.csv"))
 if not files:
@@ -180,10 +256,49 @@ posts = pd.concat(frames, ignore_index=True)
 posts = posts.dropna(subset=["created_at"]).copy()
 posts = posts.drop_duplicates(subset=["id"])
 
-for c in ["toxicity","severe_toxicity"]:
+def write_shard(rows, name=None):
+    """Append the scores of posts.loc[rows] as a new shard (tmp + rename, never rewritten)."""
+    if len(rows) == 0:
+        return
+    part = posts.loc[rows, ["id"] + SCORE_COLS].copy()
+    part["id"] = part["id"].astype(str)
+    name = name or f"shard-{time.time_ns()}.parquet"
+    tmp = SHARD_DIR / (name + ".tmp")
+    part.to_parquet(tmp, index=False)
+    os.replace(tmp, SHARD_DIR / name)
+
+def load_shards():
+    """Scores from every shard (last write per id wins) and the shard paths."""
+    paths = sorted(SHARD_DIR.glob("shard-*.parquet"))
+    if not paths:
+        return None, []
+    scored = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+    return scored.drop_duplicates(subset=["id"], keep="last").set_index("id"), paths
+
+def compact_shards():
+    """Fold all shards into one, so the next resume reads a single file."""
+    paths = sorted(SHARD_DIR.glob("shard-*.parquet"))
+    done = posts.index[posts["toxicity"].notna()]
+    if len(done) == 0:
+        return
+    write_shard(done, "compacted.new")
+    os.replace(SHARD_DIR / "compacted.new", SHARD_DIR / "shard-0-compacted.parquet")
+    for p in paths:
+        if p.name != "shard-0-compacted.parquet":
+            p.unlink(missing_ok=True)
+
+for c in SCORE_COLS:
     if c not in posts.columns:
         posts[c] = np.nan
 
+# resume: scores from earlier runs' shards
+prev, shard_paths = load_shards()
+if prev is not None:
+    key = posts["id"].astype(str)
+    for c in SCORE_COLS:
+        posts[c] = posts[c].fillna(key.map(prev[c]))
+    print(f"Resumed {int(posts['toxicity'].notna().sum())} scored rows from {len(shard_paths)} shards")
+
 need = posts["toxicity"].isna() & posts["body"].astype(str).str.len().gt(0)
 
 if SAMPLE_PER_SOURCE is None:
@@ -191,67 +306,58 @@ if SAMPLE_PER_SOURCE is None:
     print("Scoring ALL rows that need scores:", len(idx_to_score))
 else:
     idx_to_score = []
+    # rows scored by an interrupted earlier run count toward the sample
+    already = posts["toxicity"].notna().groupby(posts["source"]).sum()
     for src, part in posts[need].groupby("source"):
-        n = min(SAMPLE_PER_SOURCE, len(part))
+        n = min(SAMPLE_PER_SOURCE - int(already.get(src, 0)), len(part))
         if n > 0:
             pick = part.sample(n=n, random_state=42).index.tolist()
             idx_to_score.extend(pick)
             print(f"{src}: will score {n} rows")
     print("Total to score:", len(idx_to_score))
 
-API_URL = "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze"
-session = requests.Session()
-
-def score_text(text):
-    t = (text or "")[:2000]
-    payload = {
-        "comment": {"text": t},
-        "languages": ["en"],
-        "requestedAttributes": {
-            "TOXICITY": {},
-            "SEVERE_TOXICITY": {}
-        }
-    }
-    params = {"key": API_KEY}
-    for _ in range(3):
-        try:
-            r = session.post(API_URL, params=params, json=payload, timeout=30)
-        except requests.RequestException:
-            time.sleep(1)
-            continue
-        if r.status_code == 200:
-            data = r.json()
-            tox = np.nan
-            sev = np.nan
-            try:
-                tox = data["attributeScores"]["TOXICITY"]["summaryScore"]["value"]
-            except Exception:
-                pass
-            try:
-                sev = data["attributeScores"]["SEVERE_TOXICITY"]["summaryScore"]["value"]
-            except Exception:
-                pass
-            return tox, sev
-        if r.status_code in (429, 503):
-            time.sleep(2)
-            continue
-        return np.nan, np.nan
-    return np.nan, np.nan
+scorer = PerspectiveScorer(API_KEY, qps=PERSPECTIVE_QPS, workers=PERSPECTIVE_WORKERS, url=PERSPECTIVE_URL)
+
+cache = ScoreCache(CACHE_DB, scorer.attributes)
+
+def fill(rows, s):
+    posts.loc[rows, "toxicity"] = s["TOXICITY"]
+    posts.loc[rows, "severe_toxicity"] = s["SEVERE_TOXICITY"]
 
 if idx_to_score:
-    for start in tqdm(range(0, len(idx_to_score), BATCH_SIZE), desc="Scoring"):
-        chunk = idx_to_score[start:start + BATCH_SIZE]
-        tox_vals = []
-        sev_vals = []
-        for i in chunk:
-            t, s = score_text(posts.at[i, "body"])
-            tox_vals.append(t)
-            sev_vals.append(s)
-            time.sleep(PER_REQUEST_SLEEP)
-        posts.loc[chunk, "toxicity"] = tox_vals
-        posts.loc[chunk, "severe_toxicity"] = sev_vals
-        posts.to_parquet(OUT_PARQ, index=False)
+    # rows that send the same text share one cache entry and one request
+    rows_by_key = {}
+    for i in idx_to_score:
+        rows_by_key.setdefault(cache.key(posts.at[i, "body"]), []).append(i)
+    cached = cache.get_many(rows_by_key)
+    hit_rows = []
+    for k, s in cached.items():
+        rows = rows_by_key.pop(k)
+        fill(rows, s)
+        hit_rows.extend(rows)
+    write_shard(hit_rows)
+    print(f"Score cache: {len(cached)} of {len(cached) + len(rows_by_key)} distinct texts cached "
+          f"(hit rate {cache.hit_rate():.1%}), {len(idx_to_score)} rows -> "
+          f"{len(rows_by_key)} requests")
+
+    # one pipeline over everything; checkpoint every BATCH_SIZE finished texts
+    batch = []
+    items = ((k, posts.at[rows[0], "body"]) for k, rows in rows_by_key.items())
+    for k, s in tqdm(scorer.score_many(items), total=len(rows_by_key), desc="Scoring"):
+        fill(rows_by_key[k], s)
+        cache.put(k, s)
+        batch.extend(rows_by_key[k])
+        if len(batch) >= BATCH_SIZE:
+            cache.commit()
+            write_shard(batch)
+            batch = []
+    cache.commit()
+    write_shard(batch)
+    print("Scoring stats:", scorer.stats)
+cache.close()
 
+# the full table is written once, at the end
 posts.to_parquet(OUT_PARQ, index=False)
 posts.to_csv(OUT_CSV, index=False)
+compact_shards()
 print("Wrote:", OUT_PARQ, "and", OUT_CSV)
@@ -3,6 +3,8 @@ from flask_cors import CORS
 import psycopg2
 import json
 
+from queries import count_query, latest_post_query, recent_count_query
+
 app = Flask(__name__)
 CORS(app)
 
@@ -28,13 +30,13 @@ def get_stats():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) FROM posts_bsky")
+    cursor.execute(count_query('bsky'))
     bsky = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(*) FROM posts_4chan WHERE board_name='sp'")
+    cursor.execute(count_query('sp'))
     sp = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(*) FROM posts_4chan WHERE board_name='pol'")
+    cursor.execute(count_query('pol'))
     pol = cursor.fetchone()[0]
     
     cursor.close()
@@ -54,36 +56,24 @@ def get_live_stats():
     cursor = conn.cursor()
     
     # Get latest timestamps
-    cursor.execute("SELECT MAX(created_at) FROM posts_4chan")
+    cursor.execute(latest_post_query('posts_4chan'))
     latest_4chan = cursor.fetchone()[0]
     
-    cursor.execute("SELECT MAX(created_at) FROM posts_bsky")
+    cursor.execute(latest_post_query('posts_bsky'))
     latest_bsky = cursor.fetchone()[0]
     
     # Get posts in last hour
-    cursor.execute("""
-        SELECT COUNT(*) FROM posts_4chan
-        WHERE created_at > NOW() - INTERVAL '1 hour'
-    """)
+    cursor.execute(recent_count_query('posts_4chan', '1 hour'))
     posts_last_hour_4chan = cursor.fetchone()[0]
     
-    cursor.execute("""
-        SELECT COUNT(*) FROM posts_bsky
-        WHERE created_at > NOW() - INTERVAL '1 hour'
-    """)
+    cursor.execute(recent_count_query('posts_bsky', '1 hour'))
     posts_last_hour_bsky = cursor.fetchone()[0]
     
     # Get posts in last 24 hours
-    cursor.execute("""
-        SELECT COUNT(*) FROM posts_4chan
-        WHERE created_at > NOW() - INTERVAL '24 hours'
-    """)
+    cursor.execute(recent_count_query('posts_4chan', '24 hours'))
     posts_last_24h_4chan = cursor.fetchone()[0]
     
-    cursor.execute("""
-        SELECT COUNT(*) FROM posts_bsky
-        WHERE created_at > NOW() - INTERVAL '24 hours'
-    """)
+    cursor.execute(recent_count_query('posts_bsky', '24 hours'))
     posts_last_24h_bsky = cursor.fetchone()[0]
     
     cursor.close()
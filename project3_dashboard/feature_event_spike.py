@@ -2,6 +2,8 @@ import psycopg2
 import pandas as pd
 from datetime import datetime, timedelta
 
+from queries import hourly_activity_query, event_comparison_query, available_dates_query
+
 def get_db_connection():
     return psycopg2.connect(
         host="localhost",
@@ -14,24 +16,7 @@ def get_hourly_activity(platform, start_date, end_date):
     """Get hourly post counts for a platform within date range."""
     conn = get_db_connection()
     
-    if platform == 'bsky':
-        table = 'posts_bsky'
-        where = ""
-    else:
-        table = 'posts_4chan'
-        where = f"AND board_name = '{platform}'"
-    
-    query = f"""
-        SELECT 
-            DATE_TRUNC('hour', created_at) as hour,
-            COUNT(*) as post_count
-        FROM {table}
-        WHERE created_at >= '{start_date}'
-          AND created_at < '{end_date}'
-          {where}
-        GROUP BY DATE_TRUNC('hour', created_at)
-        ORDER BY hour
-    """
+    query = hourly_activity_query(platform, start_date, end_date)
     
     df = pd.read_sql(query, conn)
     df['hour'] = pd.to_datetime(df['hour'])
@@ -55,28 +40,7 @@ def get_event_comparison(platform, event_date):
     event_start = pd.to_datetime(event_date).replace(hour=0, minute=0, second=0)
     event_end = event_start + timedelta(days=1)
     
-    if platform == 'bsky':
-        table = 'posts_bsky'
-        where = ""
-    else:
-        table = 'posts_4chan'
-        where = f"AND board_name = '{platform}'"
-    
-    query = f"""
-        SELECT 
-            CASE 
-                WHEN EXTRACT(HOUR FROM created_at) < 12 THEN 'BEFORE'
-                WHEN EXTRACT(HOUR FROM created_at) < 18 THEN 'DURING'
-                ELSE 'AFTER'
-            END as phase,
-            COUNT(*) as post_count
-        FROM {table}
-        WHERE created_at >= '{event_start}'
-          AND created_at < '{event_end}'
-          {where}
-        GROUP BY phase
-        ORDER BY phase DESC
-    """
+    query = event_comparison_query(platform, event_start, event_end)
     
     df = pd.read_sql(query, conn)
     conn.close()
@@ -86,20 +50,7 @@ def get_available_dates(platform):
     """Get date range available in database for a platform."""
     conn = get_db_connection()
     
-    if platform == 'bsky':
-        table = 'posts_bsky'
-        where = ""
-    else:
-        table = 'posts_4chan'
-        where = f"WHERE board_name = '{platform}'"
-    
-    query = f"""
-        SELECT 
-            MIN(DATE(created_at)) as min_date,
-            MAX(DATE(created_at)) as max_date
-        FROM {table}
-        {where}
-    """
+    query = available_dates_query(platform)
     
     df = pd.read_sql(query, conn)
     conn.close()
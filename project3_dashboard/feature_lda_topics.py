@@ -5,6 +5,9 @@ from bs4 import BeautifulSoup
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.decomposition import LatentDirichletAllocation
 import warnings
+
+from queries import platform_text_query
+
 warnings.filterwarnings('ignore')
 
 def get_db_connection():
@@ -25,31 +28,11 @@ def load_platform_text(platform, start_date='2025-11-01', end_date='2025-11-15',
     """Load all text from platform."""
     conn = get_db_connection()
     
-    limit_clause = f"LIMIT {limit}" if limit else ""
-    
+    query = platform_text_query(platform, start_date, end_date, limit)
     if platform == 'bsky':
-        query = f"""
-            SELECT 
-                COALESCE(data->'record'->>'text', '') as post_text,
-                COALESCE(data->'embed'->'external'->>'title', '') as link_title,
-                COALESCE(data->'embed'->'external'->>'description', '') as link_desc
-            FROM posts_bsky
-            WHERE created_at >= '{start_date}'
-              AND created_at < '{end_date}'
-            {limit_clause}
-        """
         df = pd.read_sql(query, conn)
         df['text'] = df['post_text'] + ' ' + df['link_title'] + ' ' + df['link_desc']
     else:
-        query = f"""
-            SELECT data->>'com' as text
-            FROM posts_4chan
-            WHERE board_name = '{platform}'
-              AND created_at >= '{start_date}'
-              AND created_at < '{end_date}'
-              AND data->>'com' IS NOT NULL
-            {limit_clause}
-        """
         df = pd.read_sql(query, conn)
         df['text'] = df['text'].apply(strip_html)
     
@@ -1,6 +1,8 @@
 import psycopg2
 import pandas as pd
 
+from queries import media_engagement_4chan_query, MEDIA_ENGAGEMENT_BSKY_QUERY
+
 def get_db_connection():
     return psycopg2.connect(
         host="localhost",
@@ -13,23 +15,7 @@ def get_media_engagement_4chan(board):
     """Compare engagement for posts with/without media on 4chan."""
     conn = get_db_connection()
     
-    query = f"""
-        WITH thread_sizes AS (
-            SELECT thread_number, COUNT(*) as size
-            FROM posts_4chan
-            WHERE board_name = '{board}'
-            GROUP BY thread_number
-        )
-        SELECT 
-            CASE WHEN p.has_media THEN 'With Media' ELSE 'Text Only' END as post_type,
-            COUNT(p.post_number) as num_posts,
-            ROUND(AVG(ts.size)::numeric, 2) as avg_thread_size
-        FROM posts_4chan p
-        JOIN thread_sizes ts ON p.thread_number = ts.thread_number
-        WHERE p.board_name = '{board}'
-        GROUP BY p.has_media
-        ORDER BY p.has_media DESC
-    """
+    query = media_engagement_4chan_query(board)
     
     df = pd.read_sql(query, conn)
     conn.close()
@@ -39,17 +25,7 @@ def get_media_engagement_bsky():
     """Compare engagement for posts with/without media on Bluesky."""
     conn = get_db_connection()
     
-    query = """
-        SELECT 
-            CASE WHEN has_media THEN 'With Media' ELSE 'Text Only' END as post_type,
-            COUNT(*) as num_posts,
-            ROUND(AVG(like_count)::numeric, 2) as avg_likes,
-            ROUND(AVG(repost_count)::numeric, 2) as avg_reposts
-        FROM posts_bsky
-        WHERE like_count IS NOT NULL
-        GROUP BY has_media
-        ORDER BY has_media DESC
-    """
+    query = MEDIA_ENGAGEMENT_BSKY_QUERY
     
     df = pd.read_sql(query, conn)
     conn.close()
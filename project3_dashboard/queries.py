@@ -0,0 +1,131 @@
+"""
+SQL the dashboard runs against the crawler database.
+
+The feature modules and app_flask_fast.py build their queries here, and
+project1_crawler/app/migrations.py check EXPLAINs the same text, so the
+index check always looks at what the dashboard actually sends.
+"""
+
+def _table_and_board(platform, keyword):
+    if platform == 'bsky':
+        return 'posts_bsky', ""
+    return 'posts_4chan', f"{keyword} board_name = '{platform}'"
+
+# ---------- live stats (app_flask_fast.py) ----------
+
+def count_query(platform):
+    """Total posts for a platform."""
+    table, where = _table_and_board(platform, "WHERE")
+    return f"SELECT COUNT(*) FROM {table} {where}".rstrip()
+
+def latest_post_query(table):
+    return f"SELECT MAX(created_at) FROM {table}"
+
+def recent_count_query(table, interval):
+    """Posts in the last interval, e.g. '1 hour'."""
+    return f"""
+        SELECT COUNT(*) FROM {table}
+        WHERE created_at > NOW() - INTERVAL '{interval}'
+    """
+
+# ---------- feature_event_spike.py ----------
+
+def hourly_activity_query(platform, start_date, end_date):
+    table, where = _table_and_board(platform, "AND")
+    return f"""
+        SELECT
+            DATE_TRUNC('hour', created_at) as hour,
+            COUNT(*) as post_count
+        FROM {table}
+        WHERE created_at >= '{start_date}'
+          AND created_at < '{end_date}'
+          {where}
+        GROUP BY DATE_TRUNC('hour', created_at)
+        ORDER BY hour
+    """
+
+def event_comparison_query(platform, event_start, event_end):
+    table, where = _table_and_board(platform, "AND")
+    return f"""
+        SELECT
+            CASE
+                WHEN EXTRACT(HOUR FROM created_at) < 12 THEN 'BEFORE'
+                WHEN EXTRACT(HOUR FROM created_at) < 18 THEN 'DURING'
+                ELSE 'AFTER'
+            END as phase,
+            COUNT(*) as post_count
+        FROM {table}
+        WHERE created_at >= '{event_start}'
+          AND created_at < '{event_end}'
+          {where}
+        GROUP BY phase
+        ORDER BY phase DESC
+    """
+
+def available_dates_query(platform):
+    table, where = _table_and_board(platform, "WHERE")
+    return f"""
+        SELECT
+            MIN(DATE(created_at)) as min_date,
+            MAX(DATE(created_at)) as max_date
+        FROM {table}
+        {where}
+    """
+
+# ---------- feature_lda_topics.py ----------
+
+def platform_text_query(platform, start_date, end_date, limit=None):
+    limit_clause = f"LIMIT {limit}" if limit else ""
+    if platform == 'bsky':
+        return f"""
+            SELECT
+                COALESCE(data->'record'->>'text', '') as post_text,
+                COALESCE(data->'embed'->'external'->>'title', '') as link_title,
+                COALESCE(data->'embed'->'external'->>'description', '') as link_desc
+            FROM posts_bsky
+            WHERE created_at >= '{start_date}'
+              AND created_at < '{end_date}'
+            {limit_clause}
+        """
+    return f"""
+            SELECT data->>'com' as text
+            FROM posts_4chan
+            WHERE board_name = '{platform}'
+              AND created_at >= '{start_date}'
+              AND created_at < '{end_date}'
+              AND data->>'com' IS NOT NULL
+            {limit_clause}
+        """
+
+# ---------- feature_media_engagement.py ----------
+
+def media_engagement_4chan_query(board):
+    return f"""
+        WITH thread_sizes AS (
+            SELECT thread_number, COUNT(*) as size
+            FROM posts_4chan
+            WHERE board_name = '{board}'
+            GROUP BY thread_number
+        )
+        SELECT
+            CASE WHEN p.has_media THEN 'With Media' ELSE 'Text Only' END as post_type,
+            COUNT(p.post_number) as num_posts,
+            ROUND(AVG(ts.size)::numeric, 2) as avg_thread_size
+        FROM posts_4chan p
+        JOIN thread_sizes ts ON p.thread_number = ts.thread_number
+        WHERE p.board_name = '{board}'
+        GROUP BY p.has_media
+        ORDER BY p.has_media DESC
+    """
+
+MEDIA_ENGAGEMENT_BSKY_QUERY = """
+        SELECT
+            CASE WHEN has_media THEN 'With Media' ELSE 'Text Only' END as post_type,
+            COUNT(*) as num_posts,
+            ROUND(AVG(like_count)::numeric, 2) as avg_likes,
+            ROUND(AVG(repost_count)::numeric, 2) as avg_reposts
+        FROM posts_bsky
+        WHERE like_count IS NOT NULL
+        GROUP BY has_media
+        ORDER BY has_media DESC
+    """